@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import timeit
+
+import client
+import large_file
+import protocol
+import server
+
+
+def run_server(server_socket, batch_io):
+    logging.basicConfig(level=logging.WARNING)
+    server.BATCH_IO = batch_io
+    server.serve(server_socket)
+
+
+def start_server(batch_io=server.BATCH_IO):
+    """
+    Sobe o servidor em outro processo, em uma porta livre do loopback, para que
+    ele não dispute o GIL com os clientes medidos.
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.bind(("127.0.0.1", 0))
+    process = multiprocessing.Process(
+        target=run_server, args=(server_socket, batch_io), daemon=True
+    )
+    process.start()
+    server_address = server_socket.getsockname()
+    server_socket.close()
+    return server_address
+
+
+def udp_counters():
+    """
+    Contadores UDP do sistema (Linux): datagramas enviados e descartados por
+    buffer de recepção cheio, que no loopback é a perda real. None se indisponível.
+    """
+    try:
+        with open("/proc/net/snmp") as f:
+            lines = [line.split() for line in f if line.startswith("Udp:")]
+    except OSError:
+        return None
+    counters = dict(zip(lines[0][1:], map(int, lines[1][1:])))
+    return counters["OutDatagrams"], counters["RcvbufErrors"]
+
+
+def server_stats(server_address):
+    """Estatísticas do servidor (requisição STATS), ou None se ele não responder."""
+    stats_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    stats_socket.settimeout(1)
+    try:
+        stats_socket.sendto(b"STATS", server_address)
+        reply, _ = stats_socket.recvfrom(client.CONTROL_BUFFER_SIZE)
+    except socket.timeout:
+        return None
+    finally:
+        stats_socket.close()
+    return protocol.parse_options(reply.decode().split()[1:])
+
+
+def cache_text(before, after):
+    """Taxa de acertos do cache de pacotes do servidor entre duas leituras."""
+    if before is None or after is None:
+        return "cache indisponível"
+    hits = int(after["hits"]) - int(before["hits"])
+    lookups = hits + int(after["misses"]) - int(before["misses"])
+    return f"cache {hits / lookups if lookups else 0:.0%} de acertos"
+
+
+def run_transfer(
+    server_address, filename, mode, loss_probability, chunk_size, fec_block, index=0
+):
+    # Cada cliente grava a sua cópia em um diretório temporário, apagado no fim
+    # junto com o journal: nada fica para trás, e as medições sempre partem do zero
+    directory = tempfile.TemporaryDirectory(prefix="benchmark_")
+    output_name = os.path.join(
+        directory.name, f"received_{index}_{os.path.basename(filename)}"
+    )
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        return client.download_file(
+            client_socket,
+            server_address,
+            filename,
+            mode,
+            loss_probability,
+            chunk_size,
+            fec_block,
+            output_name,
+        )
+    finally:
+        client_socket.close()
+        directory.cleanup()
+
+
+def run_concurrent(
+    server_address, filename, mode, loss_probability, chunk_size, fec_block, clients
+):
+    """Roda `clients` transferências simultâneas; retorna (estatísticas, duração)."""
+    results = [None] * clients
+
+    def worker(index):
+        results[index] = run_transfer(
+            server_address,
+            filename,
+            mode,
+            loss_probability,
+            chunk_size,
+            fec_block,
+            index,
+        )
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return results, elapsed
+
+
+def checksum_costs(chunk_sizes, packets=20000):
+    """
+    Custo de verificar um pacote com cada checksum disponível: calcular sobre o
+    payload e comparar com o valor do cabeçalho. "md5 hex" é a verificação
+    original (MD5 em hexadecimal comparado como string), para referência.
+    """
+    for chunk_size in chunk_sizes:
+        payload = memoryview(os.urandom(chunk_size))
+        expected_hex = hashlib.md5(payload).hexdigest()
+        checks = {"md5 hex": lambda: hashlib.md5(payload).hexdigest() == expected_hex}
+        for name, checksum in protocol.CHECKSUMS.items():
+            expected = checksum(payload)
+            checks[name] = lambda checksum=checksum, expected=expected: (
+                checksum(payload) == expected
+            )
+        for name, check in checks.items():
+            seconds = min(timeit.repeat(check, number=packets, repeat=3)) / packets
+            print(
+                f"chunk {chunk_size:>5} {name:>8}: {seconds * 1e9:8.0f} ns/pacote, "
+                f"{chunk_size / seconds / (1024 * 1024):8.0f} MB/s"
+            )
+
+
+def logging_costs(packets=100000):
+    """
+    Custo por pacote de registrar cada envio: o print original (para um buffer
+    em memória, o que subestima um terminal) contra logger.debug desligado.
+    """
+    logger = logging.getLogger("benchmark.pacotes")
+    logger.setLevel(logging.INFO)
+    sink = io.StringIO()
+    costs = {
+        "print por pacote": lambda: print(f"Enviado chunk {packets}", file=sink),
+        "logger.debug desligado": lambda: logger.debug("Enviado chunk %d", packets),
+    }
+    for name, log in costs.items():
+        seconds = min(timeit.repeat(log, number=packets, repeat=3)) / packets
+        print(f"{name:>24}: {seconds * 1e9:6.0f} ns/pacote")
+
+
+def packet_rates(filename, modes, chunk_sizes, runs):
+    """
+    Pacotes por segundo de ponta a ponta no loopback, sem e com E/S em lote
+    (sendmmsg no servidor, recvmmsg no cliente), sem perda simulada.
+    """
+    for batch_io in (False, True):
+        server_address = start_server(batch_io)
+        client.BATCH_IO = batch_io
+        label = "com lote" if batch_io else "sem lote"
+        for mode, chunk_size in itertools.product(modes, chunk_sizes):
+            for run in range(1, runs + 1):
+                stats = run_transfer(
+                    server_address, filename, mode, 0.0, chunk_size or 1024, 0
+                )
+                if stats is None:
+                    print(f"{label} {mode:>6} #{run}: requisição recusada")
+                    continue
+                print(
+                    f"{label} {mode:>6} chunk {stats['chunk_size']:>5} #{run}: "
+                    f"{stats['packets'] / stats['seconds']:8.0f} pacotes/s, "
+                    f"{stats['goodput_mbps']:.2f} MB/s"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara o goodput dos modos BLAST e WINDOW no loopback."
+    )
+    parser.add_argument("filename", nargs="?", default="large_test_file.txt")
+    parser.add_argument(
+        "--loss",
+        type=float,
+        nargs="+",
+        default=[client.PACKET_LOSS_PROBABILITY],
+        help="probabilidades de perda simulada a comparar",
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["BLAST", "WINDOW"])
+    parser.add_argument(
+        "--clients", type=int, default=1, help="transferências simultâneas por rodada"
+    )
+    parser.add_argument(
+        "--chunk-sizes",
+        type=int,
+        nargs="+",
+        default=[None],
+        help="tamanhos de chunk a comparar (padrão: o escolhido pelo cliente)",
+    )
+    parser.add_argument(
+        "--fec",
+        type=int,
+        nargs="+",
+        default=[client.FEC_BLOCK],
+        help="chunks por paridade FEC a comparar (0: sem FEC)",
+    )
+    parser.add_argument(
+        "--pps",
+        action="store_true",
+        help="mede só pacotes/s sem e com E/S em lote (chunk padrão: 1024) e sai",
+    )
+    parser.add_argument(
+        "--checksums",
+        action="store_true",
+        help="mede só o custo por pacote de cada checksum e sai",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.checksums:
+        chunk_sizes = [size for size in args.chunk_sizes if size is not None]
+        checksum_costs(chunk_sizes or [1024, 1400, protocol.MAX_CHUNK_SIZE])
+        return
+
+    if args.filename == "large_test_file.txt" and not os.path.isfile(args.filename):
+        large_file.main()
+
+    if args.pps:
+        logging_costs()
+        packet_rates(args.filename, args.modes, args.chunk_sizes, args.runs)
+        return
+
+    server_address = start_server()
+    file_size = max(os.path.getsize(args.filename), 1)
+    print(f"Arquivo: {args.filename}, clientes simultâneos: {args.clients}")
+    scenarios = itertools.product(args.loss, args.modes, args.fec, args.chunk_sizes)
+    for loss_probability, mode, fec_block, chunk_size in scenarios:
+        for run in range(1, args.runs + 1):
+            before = udp_counters()
+            stats_before = server_stats(server_address)
+            results, elapsed = run_concurrent(
+                server_address,
+                args.filename,
+                mode,
+                loss_probability,
+                chunk_size,
+                fec_block,
+                args.clients,
+            )
+            after = udp_counters()
+            stats_after = server_stats(server_address)
+            done = [stats for stats in results if stats is not None]
+            label = f"{mode:>6} perda {loss_probability:.0%} fec {fec_block}"
+            if not done:
+                print(f"{label} #{run}: requisição recusada pelo servidor")
+                continue
+            received_bytes = sum(stats["bytes"] for stats in done)
+            complete = sum(stats["complete"] for stats in done)
+            dropped = sum(stats["dropped"] for stats in done)
+            retransmissions = sum(stats["retransmissions"] for stats in done)
+            recovered = sum(stats["recovered"] for stats in done)
+            received = received_bytes / (file_size * args.clients)
+            if before and after and after[0] > before[0]:
+                loss = (after[1] - before[1]) / (after[0] - before[0])
+                loss_text = f"perda no kernel {loss:.1%}"
+            else:
+                loss_text = "perda no kernel indisponível"
+            print(
+                f"{label} chunk {done[0]['chunk_size']:>5} #{run}: "
+                f"{elapsed:.2f}s, "
+                f"{received_bytes / (1024 * 1024) / elapsed:.2f} MB/s agregados, "
+                f"{complete}/{args.clients} completas ({received:.0%} dos dados), "
+                f"{dropped} descartes simulados, {retransmissions} retransmissões, "
+                f"{recovered} recuperados por FEC, {loss_text}, "
+                f"{cache_text(stats_before, stats_after)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
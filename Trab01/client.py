@@ -1,217 +1,1020 @@
-import socket
+import argparse
 import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import select
+import socket
+import sys
+import tempfile
+import threading
 import time
 import random
+import ipaddress
+from collections import deque
+
+import mmsg
+import protocol
 
 # Configuração do Cliente
 SERVER_IP = "127.0.0.1"  # Endereço IP do servidor
 SERVER_PORT = 12345
-CHUNK_SIZE = 1024  # Deve corresponder ao CHUNK_SIZE do servidor
-BUFFER_SIZE = 2048  # Deve ser >= CHUNK_SIZE + tamanho do cabeçalho
+CHUNK_SIZE = None  # Tamanho de chunk proposto no GET (None: escolhe pelo MTU)
+CONTROL_BUFFER_SIZE = 2048  # Buffer para as respostas de controle (OK/ERROR)
+RECEIVE_BUFFER_BYTES = 4 * 1024 * 1024  # SO_RCVBUF pedido ao sistema
+DEFAULT_MTU = 1500  # MTU assumido quando o do caminho não pode ser consultado
 PACKET_LOSS_PROBABILITY = 0.05  # Probabilidade de descartar um chunk (10%)
-MAX_RESEND_REQUEST_SIZE = (
-    512  # Tamanho máximo da mensagem de solicitação de retransmissão (em bytes)
-)
+LOG_LEVEL = "INFO"  # DEBUG registra cada chunk recebido (caro em altas taxas)
+BATCH_IO = True  # Recebe vários datagramas por chamada de sistema (recvmmsg)
+RECEIVE_BATCH = 64  # Máximo de datagramas por chamada
+RECEIVE_BATCH_BYTES = 1024 * 1024  # Memória dos buffers de recepção em lote
 
+# Modo de transferência: "WINDOW" (janela deslizante com ACKs) ou "BLAST"
+# (servidor envia tudo de uma vez e o cliente pede os faltantes com RESEND)
+TRANSFER_MODE = "WINDOW"
+ACK_EVERY = 2  # Envia um ACK a cada N chunks recebidos
+ACK_DELAY = 0.01  # Tempo máximo (em segundos) que um ACK fica pendente
+LINGER_TIME = 0.5  # Espera pelo EOF depois de receber todos os chunks
+FEC_BLOCK = 0  # Chunks por pacote de paridade XOR pedido ao servidor (0: sem FEC)
 
-def create_checksum(data):
-    return hashlib.md5(data).hexdigest()
+# Integridade, em ordem de preferência: checksum de cada chunk (só os disponíveis
+# aqui são propostos) e hash do arquivo inteiro, conferido no fim
+CHECKSUM_PREFERENCE = ("xxh32", "crc32", "md5")
+DIGEST_PREFERENCE = ("sha256", "md5")
+DIGEST_BLOCK = 1024 * 1024  # Leitura do arquivo recebido ao conferir o hash
 
+# Retomada de downloads interrompidos
+JOURNAL_SUFFIX = ".journal"  # Sufixo do journal ao lado do arquivo parcial
+JOURNAL_INTERVAL = 1.0  # Intervalo mínimo (s) entre gravações do journal
+MAX_RESUME_RANGES = 64  # Intervalos de faltantes listados no GET de retomada
+# Identidade do arquivo e parâmetros guardados no journal
+IDENTITY_KEYS = ("size", "mtime", "digest", "hash", "chunk")
+STOP_POLL = 0.2  # Intervalo (s) em que as esperas conferem se houve interrupção
 
-def main():
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_socket.settimeout(15)  # Define o timeout para receber dados
 
-    print("Cliente iniciado. Digite 'sair' para encerrar.")
+logger = logging.getLogger(__name__)
 
-    while True:
-        # Entrada do usuário para o nome do arquivo
-        filename = input("Digite o nome do arquivo a ser requisitado: ")
-        if filename.lower() == "sair":
-            print("Encerrando o cliente.")
-            break
+# Opções de socket do Linux ainda não expostas pelo módulo socket
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_DO = getattr(socket, "IP_PMTUDISC_DO", 2)
+IP_MTU = getattr(socket, "IP_MTU", 14)
 
-        request = f"GET {filename}"
-        client_socket.sendto(request.encode(), (SERVER_IP, SERVER_PORT))
-        print(f"Solicitado arquivo '{filename}' ao servidor.")
 
-        # Variáveis para controle
-        received_chunks = {}
-        total_chunks = None
-        retries = 0
-        max_retries = 5
+def path_mtu(server_address):
+    """
+    MTU do caminho até o servidor conforme conhecido pelo kernel (Linux), ou
+    DEFAULT_MTU se a consulta não for suportada.
+    """
+    if not sys.platform.startswith("linux"):
+        return DEFAULT_MTU
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        probe.connect(server_address)
+        return probe.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError:
+        return DEFAULT_MTU
+    finally:
+        probe.close()
 
-        # Recepção da confirmação e total de chunks
-        while True:
-            try:
-                response, _ = client_socket.recvfrom(BUFFER_SIZE)
-                if response == b"OK":
-                    total_chunks_data, _ = client_socket.recvfrom(BUFFER_SIZE)
-                    total_chunks = int(total_chunks_data.decode())
-                    print(f"Total de chunks a receber: {total_chunks}")
-                    break
-                elif response.startswith(b"ERROR"):
-                    print(response.decode())
-                    break
-                else:
-                    print("Resposta inesperada do servidor.")
-                    break
-            except socket.timeout:
-                retries += 1
-                if retries > max_retries:
-                    print("Servidor não respondeu. Tentativas excedidas.")
-                    break
-                print("Timeout ao esperar resposta do servidor. Tentando novamente...")
-                client_socket.sendto(request.encode(), (SERVER_IP, SERVER_PORT))
 
-        if total_chunks is None:
-            continue  # Pular para a próxima iteração se não recebeu o total de chunks
+def default_chunk_size(server_address):
+    """
+    No loopback usa o maior chunk que cabe em um datagrama (~64 KB); em enlaces
+    reais, o maior que cabe no MTU do caminho sem fragmentação IP (~1400 bytes).
+    """
+    try:
+        if ipaddress.ip_address(server_address[0]).is_loopback:
+            return protocol.MAX_CHUNK_SIZE
+    except ValueError:
+        pass  # Nome de host: consulta o MTU do caminho
+    ip_udp_headers = 28
+    mtu = path_mtu(server_address)
+    return protocol.clamp_chunk_size(mtu - ip_udp_headers - protocol.HEADER_SIZE)
 
-        # Recepção dos chunks
-        retry_count = 0
-        while len(received_chunks) < total_chunks and retry_count < max_retries:
-            try:
-                packet, _ = client_socket.recvfrom(BUFFER_SIZE)
 
-                if packet == b"EOF":
-                    print("Recebido pacote EOF.")
-                    break
+def receive_window_size(client_socket, chunk_size):
+    """Quantos pacotes do tamanho negociado cabem no buffer de recepção do socket."""
+    rcvbuf = client_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    # O kernel contabiliza o overhead de cada datagrama junto com o payload
+    return max(rcvbuf // (2 * (protocol.HEADER_SIZE + chunk_size)), 4)
+
+
+class TransferStopped(Exception):
+    """A transferência foi interrompida por outra thread (Ctrl+C com vários sockets)."""
+
+
+def wait_readable(sock, stop=None):
+    """
+    Espera dados em `sock` por até o timeout dele. Com `stop` (threading.Event),
+    confere a cada STOP_POLL segundos se a transferência foi interrompida. Levanta
+    socket.timeout se o tempo acabar e TransferStopped se `stop` for ligado.
+    """
+    timeout = sock.gettimeout()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        if stop is not None and stop.is_set():
+            raise TransferStopped("transferência interrompida")
+        wait = None if deadline is None else deadline - time.monotonic()
+        if wait is not None and wait <= 0:
+            raise socket.timeout("timed out")
+        if stop is not None:
+            wait = STOP_POLL if wait is None else min(wait, STOP_POLL)
+        ready, _, _ = select.select([sock], [], [], wait)
+        if ready:
+            return
+
+
+class PacketInbox:
+    """
+    Recepção dos pacotes de dados direto em buffers pré-alocados, vários por
+    chamada de sistema (recvmmsg) quando possível. next_packet() interpreta o
+    cabeçalho binário sem criar cópias e retorna o mesmo que
+    protocol.parse_packet; o payload só vale até a chamada seguinte. Com `stop`,
+    as esperas levantam TransferStopped quando ele é ligado (ver wait_readable).
+    """
 
-                # Simulação de perda de pacote (descarte aleatório)
-                if random.random() < PACKET_LOSS_PROBABILITY:
-                    print(
-                        "Chunk descartado aleatoriamente para simular perda de pacote."
-                    )
-                    continue  # Descartar o chunk e continuar para o próximo
-
-                # Processamento do pacote
-                first_pipe = packet.find(b"|")
-                second_pipe = packet.find(b"|", first_pipe + 1)
-                header_bytes = packet[: second_pipe + 1]
-                chunk_data = packet[second_pipe + 1 :]
-                header = header_bytes.decode()
-                header_parts = header.strip("|").split("|")
-                chunk_num = int(header_parts[0])
-                checksum = header_parts[1]
-
-                # Verifica se o chunk já foi recebido
-                if chunk_num in received_chunks:
+    def __init__(self, client_socket, chunk_size, stop=None):
+        packet_size = protocol.HEADER_SIZE + chunk_size
+        batch = min(max(RECEIVE_BATCH_BYTES // packet_size, 1), RECEIVE_BATCH)
+        self.sock = client_socket
+        self.receiver = mmsg.Receiver(client_socket, packet_size, batch, BATCH_IO)
+        self.batched = self.receiver.batched
+        self.stop = stop
+        self.pending = deque()
+
+    def next_packet(self):
+        while not self.pending:
+            if self.batched or self.stop is not None:
+                # recvmmsg não respeita o timeout do socket: espera com select
+                wait_readable(self.sock, self.stop)
+            if self.batched:
+                try:
+                    self.pending.extend(self.receiver.receive())
+                except BlockingIOError:
                     continue
+            else:
+                self.pending.extend(self.receiver.receive())
+        view, _ = self.pending.popleft()
+        return protocol.parse_packet(view, len(view))
 
-                # Verifica o checksum
-                if create_checksum(chunk_data) == checksum:
-                    received_chunks[chunk_num] = chunk_data
-                    print(
-                        f"Chunk {chunk_num} recebido e verificado ({len(received_chunks)}/{total_chunks})"
-                    )
-                    retry_count = 0  # Reseta o contador de retries em caso de sucesso
-                else:
-                    print(f"Checksum incorreto para o chunk {chunk_num}.")
+
+def has_chunk(bitmap, chunk_num):
+    return bitmap[chunk_num >> 3] & (0x80 >> (chunk_num & 7))
+
+
+def missing_chunks(bitmap, total_chunks):
+    return [c for c in range(total_chunks) if not has_chunk(bitmap, c)]
+
+
+def load_journal(path):
+    """
+    Lê o journal de um download parcial: uma linha "chave=valor" com a identidade
+    do arquivo e o tamanho de chunk, seguida do mapa de bits dos chunks já gravados.
+    Retorna (identidade, mapa de bits) ou None se não houver journal legível.
+    """
+    try:
+        with open(path, "rb") as f:
+            identity = protocol.parse_options(f.readline().decode().split())
+            bitmap = bytearray(f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+    if any(key not in identity for key in IDENTITY_KEYS):
+        return None
+    return identity, bitmap
+
+
+def save_journal(path, identity, bitmap):
+    """Grava o journal de forma atômica (arquivo temporário + rename)."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write((protocol.format_options(identity) + "\n").encode())
+        f.write(bitmap)
+    os.replace(temporary, path)
+
+
+def file_digest(path, algorithm):
+    file_hash = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def build_ack(received, next_expected, highest):
+    """
+    Monta um ACK: "ACK" + cumulativo `next_expected` (todos os chunks anteriores
+    recebidos) + maior chunk recebido + relatório dos faltantes entre os dois.
+    """
+    # Limita o intervalo ao que um único relatório consegue descrever
+    highest = min(highest, next_expected + protocol.REPORT_SPAN - 1)
+    missing = [
+        chunk_num
+        for chunk_num in range(next_expected, highest + 1)
+        if not has_chunk(received, chunk_num)
+    ]
+    report = protocol.encode_loss_report(missing)[0]
+    return b"ACK" + protocol.ACK.pack(next_expected, max(highest, 0)) + report
+
+
+class Receiver:
+    """
+    Estado da recepção de um arquivo: mapa dos chunks verificados, paridades FEC
+    ainda não usadas e estatísticas. Cada chunk verificado é gravado direto na sua
+    posição do arquivo de saída (pré-alocado), então a memória usada não depende
+    do tamanho do arquivo. O mapa de bits é salvo periodicamente no journal, o
+    que permite retomar o download se ele for interrompido. A simulação de perda
+    de pacotes é aplicada aqui.
+    """
+
+    def __init__(
+        self,
+        output,
+        total_chunks,
+        chunk_size,
+        file_size,
+        fec_block,
+        loss_probability,
+        journal=None,
+        identity=None,
+        received=None,
+        checksum=protocol.create_checksum,
+    ):
+        self.output = output  # Arquivo de saída aberto para leitura e escrita
+        self.total_chunks = total_chunks
+        self.chunk_size = chunk_size
+        self.file_size = file_size
+        self.fec_block = fec_block
+        self.loss_probability = loss_probability
+        self.checksum = checksum  # Checksum por chunk negociado no GET
+        self.journal = journal  # Caminho do journal (None: sem journal)
+        self.identity = identity
+        self.last_save = time.monotonic()
+        # Mapa de bits dos chunks já gravados (bit 7 do byte 0 = chunk 0)
+        if received is None:
+            received = bytearray((total_chunks + 7) // 8)
+        self.received = received
+        self.received_count = total_chunks - len(missing_chunks(received, total_chunks))
+        self.received_bytes = 0  # Bytes recebidos nesta execução
+        self.seen = bytearray(total_chunks)  # Chunks que já chegaram alguma vez
+        self.parity = {}  # bloco -> paridade recebida e ainda não usada
+        self.packets = 0  # Datagramas de dados e paridade que chegaram
+        self.dropped = 0
+        self.retransmissions = 0
+        self.recovered = 0
+
+    def complete(self):
+        return self.received_count == self.total_chunks
+
+    def has(self, chunk_num):
+        return has_chunk(self.received, chunk_num)
+
+    def missing(self):
+        return missing_chunks(self.received, self.total_chunks)
+
+    def save_journal(self):
+        # Os dados precisam chegar ao arquivo antes do mapa que os declara gravados
+        self.output.flush()
+        save_journal(self.journal, self.identity, self.received)
+        self.last_save = time.monotonic()
+
+    def chunk_length(self, chunk_num):
+        if chunk_num == self.total_chunks - 1:
+            return self.file_size - chunk_num * self.chunk_size
+        return self.chunk_size
+
+    def accept(self, flags, chunk_num, checksum, payload):
+        """
+        Processa um pacote de dados ou de paridade. Retorna a lista de chunks que
+        passaram a estar disponíveis: vazia para descartes, duplicatas e pacotes
+        inválidos; mais de um quando o pacote permite reconstruir um chunk perdido.
+        """
+        self.packets += 1
+        is_parity = flags & protocol.FLAG_PARITY
+        if not is_parity and chunk_num < self.total_chunks:
+            # Retransmissões são contadas na chegada, antes da perda simulada
+            if self.seen[chunk_num]:
+                self.retransmissions += 1
+            self.seen[chunk_num] = 1
+
+        # Simulação de perda de pacote (descarte aleatório)
+        if random.random() < self.loss_probability:
+            self.dropped += 1
+            return []
+
+        if is_parity:
+            if not self.fec_block or self.checksum(payload) != checksum:
+                return []
+            self.parity[chunk_num] = bytes(payload)
+            return self._recover(chunk_num)
+
+        if chunk_num >= self.total_chunks or self.has(chunk_num):
+            return []
+        if self.checksum(payload) != checksum:
+            logger.warning("Checksum incorreto para o chunk %d.", chunk_num)
+            return []
+        self._store(chunk_num, payload)
+        if not self.fec_block:
+            return [chunk_num]
+        return [chunk_num] + self._recover(chunk_num // self.fec_block)
+
+    def _store(self, chunk_num, data):
+        self.output.seek(chunk_num * self.chunk_size)
+        self.output.write(data)
+        self.received[chunk_num >> 3] |= 0x80 >> (chunk_num & 7)
+        self.received_count += 1
+        self.received_bytes += len(data)
+        if self.journal and time.monotonic() - self.last_save >= JOURNAL_INTERVAL:
+            self.save_journal()
+
+    def _recover(self, block):
+        """Reconstrói o único chunk faltante do bloco a partir da sua paridade XOR."""
+        parity = self.parity.get(block)
+        if parity is None:
+            return []
+        first = block * self.fec_block
+        last = min(first + self.fec_block, self.total_chunks)
+        missing = [c for c in range(first, last) if not self.has(c)]
+        if len(missing) != 1:
+            if not missing:
+                del self.parity[block]
+            return []
+
+        # Os demais chunks do bloco são relidos do arquivo de saída. Little-endian:
+        # chunks menores (o último) equivalem a chunks completados com zeros no fim
+        value = int.from_bytes(parity, "little")
+        for chunk_num in range(first, last):
+            if chunk_num != missing[0]:
+                self.output.seek(chunk_num * self.chunk_size)
+                data = self.output.read(self.chunk_length(chunk_num))
+                value ^= int.from_bytes(data, "little")
+        chunk_num = missing[0]
+        data = value.to_bytes(self.chunk_size, "little")
+        self._store(chunk_num, data[: self.chunk_length(chunk_num)])
+        del self.parity[block]
+        self.recovered += 1
+        return [chunk_num]
+
+
+def receive_window(client_socket, server_address, receiver, stop=None):
+    """
+    Recebe os chunks no modo WINDOW. O servidor só envia o que cabe na janela,
+    então o cliente confirma os chunks com ACKs cumulativos/seletivos à medida
+    que chegam.
+    """
+    max_retries = 5
+    retry_count = 0
+    next_expected = 0
+    highest = -1
+    unacked = 0
+    inbox = PacketInbox(client_socket, receiver.chunk_size, stop)
+    # Na retomada, os chunks iniciais já podem estar gravados
+    while next_expected < receiver.total_chunks and receiver.has(next_expected):
+        next_expected += 1
+
+    def send_ack():
+        ack = build_ack(receiver.received, next_expected, highest)
+        client_socket.sendto(ack, server_address)
+
+    while retry_count < max_retries:
+        complete = receiver.complete()
+        if complete:
+            client_socket.settimeout(LINGER_TIME)
+        else:
+            client_socket.settimeout(ACK_DELAY if unacked else 15)
+        try:
+            packet = inbox.next_packet()
+        except socket.timeout:
+            if complete:
+                break
+            if unacked:
+                send_ack()
+                unacked = 0
+                continue
+            retry_count += 1
+            logger.warning(
+                "Timeout ao receber dados. Tentativa %d/%d", retry_count, max_retries
+            )
+            continue
+
+        if packet is None:
+            logger.debug("Pacote inesperado recebido e descartado.")
+            continue
+        flags, chunk_num, checksum, chunk_data = packet
+        if flags & protocol.FLAG_EOF:
+            logger.debug("Recebido pacote EOF.")
+            break
+
+        new_chunks = receiver.accept(flags, chunk_num, checksum, chunk_data)
+        unacked += 1
+        if not new_chunks and not flags & protocol.FLAG_PARITY:
+            # Duplicata: o ACK anterior provavelmente se perdeu
+            unacked = ACK_EVERY
+        for chunk_num in new_chunks:
+            retry_count = 0
+            highest = max(highest, chunk_num)
+            if chunk_num != next_expected:
+                # Chegada fora de ordem: avisa o servidor sobre a lacuna imediatamente
+                unacked = ACK_EVERY
+            while next_expected < receiver.total_chunks and receiver.has(next_expected):
+                next_expected += 1
+
+        if unacked >= ACK_EVERY or receiver.complete():
+            send_ack()
+            unacked = 0
+
+
+def receive_blast(client_socket, server_address, receiver, stop=None):
+    """
+    Recebe os chunks no modo BLAST: o servidor envia o arquivo inteiro seguido de
+    EOF, e o cliente pede todos os faltantes de uma vez com RESEND (relatórios
+    compactos, ver protocol.encode_loss_report). Cada rodada de retransmissão
+    custa um RTT, qualquer que seja a quantidade de chunks perdidos.
+    """
+    max_retries = 5
+    total_chunks = receiver.total_chunks
+    inbox = PacketInbox(client_socket, receiver.chunk_size, stop)
+    resend_round = 0  # 0: envio inicial; o EOF de cada rodada traz o número dela
+    retry_count = 0
+    previously_missing = total_chunks
+
+    while True:
+        # Recepção dos chunks da rodada até o EOF correspondente
+        while not receiver.complete():
+            try:
+                packet = inbox.next_packet()
             except socket.timeout:
-                retry_count += 1
-                print(
-                    f"Timeout ao receber dados. Tentativa {retry_count}/{max_retries}"
-                )
-                if retry_count >= max_retries:
-                    print("Tentativas excedidas. Encerrando recebimento.")
-                    break
+                logger.warning("Timeout ao receber dados.")
+                break
+            if packet is None:
                 continue
-            except Exception as e:
-                print(f"Ocorreu um erro: {e}")
+            flags, chunk_num, checksum, chunk_data = packet
+
+            if flags & protocol.FLAG_EOF:
+                if chunk_num != resend_round:
+                    continue  # EOF atrasado de uma rodada anterior
+                if resend_round:
+                    logger.debug("Recebido pacote EOF após retransmissão.")
+                else:
+                    logger.debug("Recebido pacote EOF.")
                 break
 
+            for chunk_num in receiver.accept(flags, chunk_num, checksum, chunk_data):
+                logger.debug(
+                    "Chunk %d recebido e verificado (%d/%d)",
+                    chunk_num,
+                    receiver.received_count,
+                    total_chunks,
+                )
+
         # Verificação de chunks faltantes
-        missing_chunks = set(range(total_chunks)) - set(received_chunks.keys())
-        if missing_chunks:
-            print(f"Chunks faltantes: {missing_chunks}")
-            # Dividir a lista de chunks faltantes em blocos menores
-            missing_chunks_list = sorted(list(missing_chunks))
-            chunks_per_request = 50  # Ajuste este valor conforme necessário
-            for i in range(0, len(missing_chunks_list), chunks_per_request):
-                chunk_block = missing_chunks_list[i : i + chunks_per_request]
-                resend_request = f"RESEND {' '.join(map(str, chunk_block))}"
-                # Verificar se a mensagem não excede o tamanho máximo permitido
-                while len(resend_request.encode()) > MAX_RESEND_REQUEST_SIZE:
-                    # Reduzir o número de chunks no bloco
-                    chunks_per_request -= 5
-                    chunk_block = missing_chunks_list[i : i + chunks_per_request]
-                    resend_request = f"RESEND {' '.join(map(str, chunk_block))}"
-                    if chunks_per_request <= 0:
-                        print(
-                            "Erro: Não foi possível criar uma solicitação de retransmissão dentro do limite de tamanho."
-                        )
-                        return
-
-                client_socket.sendto(resend_request.encode(), (SERVER_IP, SERVER_PORT))
-                print(f"Solicitada retransmissão dos chunks: {chunk_block}")
-
-                # Recebe os chunks retransmitidos
-                retry_count = 0
-                while chunk_block and retry_count < max_retries:
-                    try:
-                        packet, _ = client_socket.recvfrom(BUFFER_SIZE)
-
-                        if packet == b"EOF":
-                            print("Recebido pacote EOF após retransmissão.")
-                            break
-
-                        # Simulação de perda de pacote na retransmissão
-                        if random.random() < PACKET_LOSS_PROBABILITY:
-                            print("Chunk retransmitido descartado aleatoriamente.")
-                            continue  # Descartar o chunk e continuar para o próximo
-
-                        # Processamento do pacote
-                        first_pipe = packet.find(b"|")
-                        second_pipe = packet.find(b"|", first_pipe + 1)
-                        header_bytes = packet[: second_pipe + 1]
-                        chunk_data = packet[second_pipe + 1 :]
-                        header = header_bytes.decode()
-                        header_parts = header.strip("|").split("|")
-                        chunk_num = int(header_parts[0])
-                        checksum = header_parts[1]
-
-                        if chunk_num in chunk_block:
-                            if create_checksum(chunk_data) == checksum:
-                                received_chunks[chunk_num] = chunk_data
-                                chunk_block.remove(chunk_num)
-                                print(
-                                    f"Chunk faltante {chunk_num} recebido ({len(received_chunks)}/{total_chunks})"
-                                )
-                                retry_count = (
-                                    0  # Reseta o contador de retries em caso de sucesso
-                                )
-                            else:
-                                print(
-                                    f"Checksum incorreto para o chunk retransmitido {chunk_num}"
-                                )
-                    except socket.timeout:
-                        retry_count += 1
-                        print(
-                            f"Timeout ao receber dados retransmitidos. Tentativa {retry_count}/{max_retries}"
-                        )
-                        if retry_count >= max_retries:
-                            print("Tentativas excedidas ao receber chunks faltantes.")
-                            break
-                        continue
-                    except Exception as e:
-                        print(f"Ocorreu um erro: {e}")
-                        break
+        missing_chunks = receiver.missing()
+        if not missing_chunks:
+            logger.debug("Todos os chunks foram recebidos com sucesso.")
+            return
+
+        if len(missing_chunks) < previously_missing:
+            retry_count = 0  # Reseta o contador de retries em caso de progresso
         else:
-            print("Todos os chunks foram recebidos com sucesso.")
-
-        # Montagem do arquivo recebido
-        if len(received_chunks) == total_chunks:
-            with open(f"received_{filename}", "wb") as f:
-                for chunk_num in sorted(received_chunks.keys()):
-                    f.write(received_chunks[chunk_num])
-            print(f"Arquivo '{filename}' recebido com sucesso.")
+            retry_count += 1
+            if retry_count >= max_retries:
+                logger.warning("Tentativas excedidas ao receber chunks faltantes.")
+                return
+        previously_missing = len(missing_chunks)
+
+        # Uma rodada: todos os faltantes, em quantos relatórios forem necessários
+        resend_round = (resend_round + 1) & 0xFFFF
+        reports = protocol.encode_loss_report(missing_chunks)
+        for index, report in enumerate(reports):
+            last = index == len(reports) - 1
+            request = b"RESEND" + protocol.RESEND.pack(resend_round, last) + report
+            client_socket.sendto(request, server_address)
+        logger.debug(
+            "Solicitada retransmissão de %d chunks em %d datagrama(s) (rodada %d).",
+            len(missing_chunks),
+            len(reports),
+            resend_round,
+        )
+
+
+def download_file(
+    client_socket,
+    server_address,
+    filename,
+    mode=TRANSFER_MODE,
+    loss_probability=PACKET_LOSS_PROBABILITY,
+    chunk_size=CHUNK_SIZE,
+    fec_block=FEC_BLOCK,
+    output_name=None,
+    stop=None,
+):
+    """
+    Requisita `filename` ao servidor e grava-o como `output_name` (padrão:
+    "received_<nome>") à medida que os chunks chegam. Se a transferência não se
+    completar, o arquivo parcial e o journal ficam no disco, e a próxima chamada
+    pede ao servidor só os chunks que faltam (se o arquivo não mudou lá). `stop`
+    (threading.Event) interrompe a transferência quando rodando fora da thread
+    principal, que é a única a receber o Ctrl+C.
+    Retorna um dicionário com estatísticas da transferência (o goodput considera
+    apenas chunks verificados), ou None se o servidor não aceitou a requisição.
+    """
+    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_BYTES)
+    if output_name is None:
+        output_name = f"received_{filename}"
+    journal_name = output_name + JOURNAL_SUFFIX
+
+    # Download parcial anterior: propõe o mesmo tamanho de chunk e lista os faltantes
+    journal = None
+    if os.path.isfile(output_name):
+        journal = load_journal(journal_name)
+    missing = None
+    if journal is not None:
+        file_size, journal_chunk = int(journal[0]["size"]), int(journal[0]["chunk"])
+        total_chunks = file_size // journal_chunk + (file_size % journal_chunk > 0)
+        if len(journal[1]) != (total_chunks + 7) // 8:
+            journal = None  # Mapa de bits truncado: o journal não é confiável
         else:
-            print("Não foi possível receber todos os chunks.")
+            chunk_size = journal_chunk
+            missing = missing_chunks(journal[1], total_chunks)
+            logger.info(
+                "Retomando '%s': faltam %d/%d chunks.",
+                filename,
+                len(missing),
+                total_chunks,
+            )
+    if chunk_size is None:
+        chunk_size = default_chunk_size(server_address)
+
+    def build_request():
+        # O servidor pode reduzir o tamanho proposto; a janela anunciada usa o
+        # proposto como estimativa e é limitada pelo servidor de qualquer forma
+        options = {
+            "chunk": chunk_size,
+            "window": receive_window_size(client_socket, chunk_size),
+            "fec": fec_block,
+            "check": ",".join(
+                name for name in CHECKSUM_PREFERENCE if name in protocol.CHECKSUMS
+            ),
+            "digest": ",".join(DIGEST_PREFERENCE),
+        }
+        if missing:
+            ranges = protocol.missing_ranges(missing, MAX_RESUME_RANGES)
+            options["missing"] = protocol.format_ranges(ranges)
+        request = f"GET {filename} "
+        if mode == "WINDOW":
+            request += "WINDOW "
+        return (request + protocol.format_options(options)).encode()
+
+    request = build_request()
+    start = time.monotonic()
+    client_socket.settimeout(15)  # Define o timeout para receber dados
+    client_socket.sendto(request, server_address)
+    logger.info("Solicitado arquivo '%s' ao servidor.", filename)
+
+    # Variáveis para controle
+    reply = None
+    retries = 0
+    max_retries = 5
+
+    # Recepção da confirmação, dos parâmetros acordados e da identidade do arquivo
+    while True:
+        try:
+            wait_readable(client_socket, stop)
+            response, _ = client_socket.recvfrom(CONTROL_BUFFER_SIZE)
+            if response.startswith(b"OK "):
+                reply = protocol.parse_options(response.decode().split()[1:])
+                identity = {key: reply[key] for key in IDENTITY_KEYS}
+                if journal is not None and identity != journal[0]:
+                    # O arquivo mudou no servidor (ou o chunk foi outro): recomeça
+                    logger.info("Arquivo diferente do download parcial; recomeçando.")
+                    journal = missing = None
+                    reply = None
+                    request = build_request()
+                    client_socket.sendto(request, server_address)
+                    continue
+                break
+            elif response.startswith(b"ERROR"):
+                logger.error(response.decode())
+                break
+            # Restos de uma transferência anterior são ignorados
+        except socket.timeout:
+            retries += 1
+            if retries > max_retries:
+                logger.error("Servidor não respondeu. Tentativas excedidas.")
+                break
+            logger.warning(
+                "Timeout ao esperar resposta do servidor. Tentando novamente..."
+            )
+            client_socket.sendto(request, server_address)
+
+    if reply is None:
+        return None
+
+    total_chunks = int(reply["total"])
+    chunk_size = int(reply["chunk"])
+    file_size = int(reply["size"])
+    logger.info("Total de chunks a receber: %d de %d bytes", total_chunks, chunk_size)
+    if journal is not None:
+        output = open(output_name, "r+b")
+    else:
+        output = open(output_name, "w+b")
+        output.truncate(file_size)  # Pré-aloca o arquivo de saída
+    receiver = Receiver(
+        output,
+        total_chunks,
+        chunk_size,
+        file_size,
+        int(reply["fec"]),
+        loss_probability,
+        journal_name,
+        identity,
+        journal[1] if journal is not None else None,
+        protocol.CHECKSUMS[reply["check"]],
+    )
+
+    receive = receive_window if mode == "WINDOW" else receive_blast
+    try:
+        receive(client_socket, server_address, receiver, stop)
+    except TransferStopped:
+        logger.warning("Transferência de '%s' interrompida.", filename)
+    finally:
+        # Também se a transferência for interrompida, pelo Ctrl+C nesta thread
+        # (KeyboardInterrupt) ou por `stop`: o journal registra o que já foi gravado
+        if receiver.complete():
+            receiver.output.close()
+            if os.path.exists(journal_name):
+                os.remove(journal_name)
+        else:
+            receiver.save_journal()
+            receiver.output.close()
+
+    elapsed = time.monotonic() - start
+    received_bytes = receiver.received_bytes
+    complete = receiver.complete()
+
+    # Verificação de ponta a ponta: hash do arquivo gravado contra o do servidor
+    if complete and file_digest(output_name, reply["digest"]) != reply["hash"]:
+        complete = False
+        os.remove(output_name)
+        logger.error(
+            "Hash %s do arquivo não confere; arquivo descartado.", reply["digest"]
+        )
+    elif complete:
+        logger.info(
+            "Arquivo '%s' recebido em %.2fs: %d bytes (%.2f MB/s), %d descartes "
+            "simulados, %d retransmissões, %d recuperados por FEC.",
+            filename,
+            elapsed,
+            received_bytes,
+            received_bytes / (1024 * 1024) / elapsed,
+            receiver.dropped,
+            receiver.retransmissions,
+            receiver.recovered,
+        )
+    else:
+        logger.warning(
+            "Não foi possível receber todos os chunks. O download pode ser retomado "
+            "com uma nova requisição."
+        )
+
+    return {
+        "filename": filename,
+        "mode": mode,
+        "complete": complete,
+        "chunk_size": chunk_size,
+        "fec_block": receiver.fec_block,
+        "bytes": received_bytes,
+        "seconds": elapsed,
+        "goodput_mbps": received_bytes / (1024 * 1024) / elapsed,
+        "packets": receiver.packets,
+        "dropped": receiver.dropped,
+        "retransmissions": receiver.retransmissions,
+        "recovered": receiver.recovered,
+    }
+
+
+def run_transfer(client_socket, server_address, filename, output_name, settings):
+    """
+    download_file que não levanta exceção: uma transferência recusada, com erro de
+    rede ou com resposta malformada vira um registro com "complete" falso e o
+    motivo em "error", para que uma falha não derrube a carga inteira.
+    """
+    start = time.monotonic()
+    try:
+        stats = download_file(
+            client_socket, server_address, filename, output_name=output_name, **settings
+        )
+    except Exception as e:
+        stats = {"error": f"{type(e).__name__}: {e}"}
+    else:
+        if stats is None:
+            stats = {"error": "requisição recusada ou sem resposta"}
+    if "error" in stats:
+        stats |= {
+            "filename": filename,
+            "complete": False,
+            "bytes": 0,
+            "seconds": time.monotonic() - start,
+        }
+    return stats
+
+
+def download_many(server_address, filenames, sockets, output_dir, settings):
+    """
+    Baixa a lista `filenames` usando `sockets` sockets UDP em paralelo, cada um
+    buscando o próximo arquivo da fila ao terminar o anterior. O servidor mantém
+    uma sessão por endereço, então os arquivos de um mesmo socket são pedidos em
+    sequência. Retorna as estatísticas na ordem da lista. No Ctrl+C, as
+    transferências em andamento gravam o journal antes de KeyboardInterrupt
+    seguir adiante.
+    """
+    jobs = deque(enumerate(filenames))
+    results = [None] * len(filenames)
+    stop = threading.Event()
+    settings = settings | {"stop": stop}
+
+    def worker():
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            while jobs and not stop.is_set():
+                try:
+                    index, filename = jobs.popleft()
+                except IndexError:
+                    break
+                output_name = os.path.join(
+                    output_dir, f"received_{os.path.basename(filename)}"
+                )
+                results[index] = run_transfer(
+                    client_socket, server_address, filename, output_name, settings
+                )
+        finally:
+            client_socket.close()
+
+    if sockets <= 1:
+        # Na thread principal, o próprio KeyboardInterrupt passa pelo download
+        worker()
+        return results
+    threads = [threading.Thread(target=worker) for _ in range(sockets)]
+    for thread in threads:
+        thread.start()
+    join_all(threads, stop)
+    return results
+
+
+def join_all(threads, stop):
+    """
+    Espera as threads. O Ctrl+C só chega à thread principal: nele, liga `stop`
+    para que as transferências parem e gravem os journals, espera o fim delas e
+    repassa o KeyboardInterrupt.
+    """
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+
+
+def generate_load(server_address, filenames, clients, repeat, duration, settings):
+    """
+    Gerador de carga: `clients` clientes virtuais, cada um com o seu socket,
+    baixando os arquivos da lista em rodízio, `repeat` vezes cada um ou, se
+    `duration` for dado, até esgotar o tempo. As cópias vão para um diretório
+    temporário e são apagadas ao fim de cada transferência (assim como journals,
+    para que toda medição parta do zero). Retorna a lista de estatísticas, com o
+    índice do cliente e o instante de início relativo.
+    """
+    results = []
+    results_lock = threading.Lock()
+    start = time.monotonic()
+    stop = threading.Event()
+    settings = settings | {"stop": stop}
+
+    def virtual_client(index, directory):
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for count in itertools.count():
+                if stop.is_set():
+                    break
+                if duration is None and count >= repeat * len(filenames):
+                    break
+                if duration is not None and time.monotonic() - start >= duration:
+                    break
+                filename = filenames[(index + count) % len(filenames)]
+                output_name = os.path.join(
+                    directory, f"{index}_{os.path.basename(filename)}"
+                )
+                started = time.monotonic() - start
+                stats = run_transfer(
+                    client_socket, server_address, filename, output_name, settings
+                )
+                for path in (output_name, output_name + JOURNAL_SUFFIX):
+                    if os.path.exists(path):
+                        os.remove(path)
+                with results_lock:
+                    results.append(stats | {"client": index, "started": started})
+        finally:
+            client_socket.close()
+
+    with tempfile.TemporaryDirectory(prefix="carga_") as directory:
+        threads = [
+            threading.Thread(target=virtual_client, args=(i, directory))
+            for i in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        join_all(threads, stop)
+    return results
+
+
+def percentile(values, fraction):
+    """Percentil por posição mais próxima (values ordenado e não vazio)."""
+    return values[min(max(math.ceil(fraction * len(values)) - 1, 0), len(values) - 1)]
+
+
+def summarize(transfers, elapsed):
+    """Resumo das transferências: latências (duração de cada uma) e totais."""
+    done = [stats for stats in transfers if stats["complete"]]
+    latencies = sorted(stats["seconds"] for stats in done)
+    received_bytes = sum(stats["bytes"] for stats in transfers)
+    summary = {
+        "transfers": len(transfers),
+        "complete": len(done),
+        "failed": len(transfers) - len(done),
+        "elapsed": elapsed,
+        "bytes": received_bytes,
+        "goodput_mbps": received_bytes / (1024 * 1024) / elapsed if elapsed else 0,
+    }
+    for key in ("packets", "dropped", "retransmissions", "recovered"):
+        summary[key] = sum(stats.get(key, 0) for stats in transfers)
+    if latencies:
+        summary["latency"] = {
+            "min": latencies[0],
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1],
+            "mean": sum(latencies) / len(latencies),
+        }
+        goodputs = sorted(stats["goodput_mbps"] for stats in done)
+        summary["transfer_goodput_mbps"] = {
+            "min": goodputs[0],
+            "p50": percentile(goodputs, 0.5),
+            "max": goodputs[-1],
+        }
+    return summary
+
+
+def parse_address(text):
+    """Converte "host:porta" (ou só "host") em uma tupla de endereço."""
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, SERVER_PORT
+    return host, int(port)
+
+
+def interactive(server_address):
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    print("Cliente iniciado. Digite 'sair' para encerrar.")
+
+    while True:
+        # Entrada do usuário para o nome do arquivo
+        filename = input("Digite o nome do arquivo a ser requisitado: ")
+        if filename.lower() == "sair":
+            print("Encerrando o cliente.")
+            break
+
+        download_file(client_socket, server_address, filename)
 
     # Fechamento do socket após sair do loop
     client_socket.close()
     print("Conexão encerrada.")
 
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cliente do protocolo UDP. Sem arquivos na linha de comando, "
+        "pergunta os nomes interativamente."
+    )
+    parser.add_argument("filenames", nargs="*", help="arquivos a requisitar")
+    parser.add_argument(
+        "--server",
+        type=parse_address,
+        default=(SERVER_IP, SERVER_PORT),
+        help=f"host:porta do servidor (padrão: {SERVER_IP}:{SERVER_PORT})",
+    )
+    parser.add_argument("--mode", choices=("BLAST", "WINDOW"), default=TRANSFER_MODE)
+    parser.add_argument(
+        "--loss",
+        type=float,
+        default=PACKET_LOSS_PROBABILITY,
+        help="probabilidade de descarte simulado por chunk",
+    )
+    parser.add_argument(
+        "--chunk", type=int, default=CHUNK_SIZE, help="tamanho de chunk proposto"
+    )
+    parser.add_argument(
+        "--fec", type=int, default=FEC_BLOCK, help="chunks por paridade (0: sem FEC)"
+    )
+    parser.add_argument(
+        "--sockets",
+        type=int,
+        default=1,
+        help="sockets em paralelo para a lista de arquivos (1: um após o outro)",
+    )
+    parser.add_argument(
+        "--output-dir", default=".", help="diretório das cópias recebidas"
+    )
+    parser.add_argument(
+        "--load",
+        type=int,
+        metavar="N",
+        help="gerador de carga: N clientes virtuais baixando os arquivos em rodízio",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="na carga, quantas vezes cada cliente percorre a lista",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="na carga, segundos de teste (substitui --repeat)",
+    )
+    parser.add_argument(
+        "--json", metavar="ARQUIVO", help="grava o resumo e cada transferência em JSON"
+    )
+    parser.add_argument("--log-level", default=None, help=f"padrão: {LOG_LEVEL}")
+    args = parser.parse_args()
+
+    # Com várias transferências simultâneas o log por arquivo só atrapalha
+    log_level = args.log_level or (LOG_LEVEL if args.load is None else "WARNING")
+    logging.basicConfig(level=log_level, format="%(levelname)s %(message)s")
+
+    if not args.filenames:
+        if args.load is not None:
+            parser.error("--load precisa de pelo menos um arquivo")
+        interactive(args.server)
+        return
+
+    settings = {
+        "mode": args.mode,
+        "loss_probability": args.loss,
+        "chunk_size": args.chunk,
+        "fec_block": args.fec,
+    }
+    start = time.monotonic()
+    try:
+        if args.load is not None:
+            transfers = generate_load(
+                args.server,
+                args.filenames,
+                args.load,
+                args.repeat,
+                args.duration,
+                settings,
+            )
+        else:
+            transfers = download_many(
+                args.server, args.filenames, args.sockets, args.output_dir, settings
+            )
+    except KeyboardInterrupt:
+        print("Interrompido. Downloads incompletos podem ser retomados.")
+        sys.exit(130)
+    elapsed = time.monotonic() - start
+    summary = summarize(transfers, elapsed)
+
+    latency = summary.get("latency")
+    print(
+        f"{summary['complete']}/{summary['transfers']} transferências completas em "
+        f"{elapsed:.2f}s, {summary['goodput_mbps']:.2f} MB/s agregados, "
+        f"{summary['retransmissions']} retransmissões"
+        + (
+            f", latência p50 {latency['p50']:.3f}s p90 {latency['p90']:.3f}s "
+            f"p99 {latency['p99']:.3f}s"
+            if latency
+            else ""
+        )
+    )
+    if args.json:
+        report = {
+            "server": f"{args.server[0]}:{args.server[1]}",
+            "clients": args.load if args.load is not None else args.sockets,
+            "settings": settings,
+            "summary": summary,
+            "transfers": transfers,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if summary["failed"]:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,252 @@
+import ctypes
+import errno
+import os
+import socket
+import struct
+import sys
+
+# Envio e recepção de vários datagramas por chamada de sistema (sendmmsg/recvmmsg
+# do Linux, via ctypes). Em outros sistemas, sem as funções na libc ou para
+# sockets que não são IPv4, as mesmas classes fazem uma chamada sendto ou
+# recvfrom_into por datagrama.
+#
+# As estruturas do kernel são montadas com struct.pack_into em buffers
+# pré-alocados (criar objetos ctypes por mensagem custaria mais que a própria
+# chamada de sistema economizada).
+
+MAX_BATCH = 1024  # Limite do kernel para mensagens por chamada (UIO_MAXIOV)
+SEND_ARENA_BYTES = 1024 * 1024  # Área onde os datagramas de um lote são copiados
+MSG_DONTWAIT = 0x40
+SOCKADDR_IN_SIZE = 16
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.c_void_p),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+# Mesmos layouts em formato struct (alinhamento nativo)
+IOVEC = struct.Struct("PN")  # iov_base, iov_len
+MSGHDR = struct.Struct("PIPN")  # msg_name, msg_namelen, msg_iov, msg_iovlen
+POINTER = struct.Struct("P")
+MMSGHDR_SIZE = ctypes.sizeof(MMsgHdr)
+MSG_LEN_OFFSET = MMsgHdr.msg_len.offset
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    if (
+        IOVEC.size != ctypes.sizeof(IOVec)
+        or MSGHDR.size != MsgHdr.msg_control.offset
+        or struct.calcsize("PIP") - struct.calcsize("P") != MsgHdr.msg_iov.offset
+    ):
+        return None  # ABI inesperada: melhor não usar
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        functions = libc.sendmmsg, libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    for function in functions:
+        function.restype = ctypes.c_int
+    libc.sendmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.c_void_p,
+        ctypes.c_uint,
+        ctypes.c_int,
+    ]
+    libc.recvmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.c_void_p,
+        ctypes.c_uint,
+        ctypes.c_int,
+        ctypes.c_void_p,
+    ]
+    return libc
+
+
+libc = _load_libc()
+AVAILABLE = libc is not None
+
+
+def _address_of(buffer):
+    """Endereço de memória de um bytearray (que não pode mais mudar de tamanho)."""
+    return ctypes.addressof((ctypes.c_char * len(buffer)).from_buffer(buffer))
+
+
+def _raise_errno():
+    code = ctypes.get_errno()
+    if code in (errno.EAGAIN, errno.EWOULDBLOCK):
+        raise BlockingIOError(code, os.strerror(code))
+    raise OSError(code, os.strerror(code))
+
+
+def batching(sock):
+    return AVAILABLE and sock.family == socket.AF_INET
+
+
+class Sender:
+    """Envio em lote de datagramas, cada um para o seu endereço IPv4."""
+
+    def __init__(self, sock, arena_bytes=SEND_ARENA_BYTES):
+        self.sock = sock
+        self.batched = batching(sock)
+        if not self.batched:
+            return
+        self.arena = bytearray(max(arena_bytes, 65536))
+        self.iovecs = bytearray(IOVEC.size * MAX_BATCH)
+        self.headers = bytearray(MMSGHDR_SIZE * MAX_BATCH)
+        self.arena_address = _address_of(self.arena)
+        self.headers_address = _address_of(self.headers)
+        self.addresses = {}  # endereço -> (sockaddr_in, endereço de memória)
+        # Cada cabeçalho aponta sempre para o mesmo iovec; por mensagem só mudam o
+        # destino e a posição/tamanho dos dados na área de cópia
+        iovecs_address = _address_of(self.iovecs)
+        for i in range(MAX_BATCH):
+            MSGHDR.pack_into(
+                self.headers,
+                i * MMSGHDR_SIZE,
+                0,
+                SOCKADDR_IN_SIZE,
+                iovecs_address + i * IOVEC.size,
+                1,
+            )
+
+    def _sockaddr(self, address):
+        entry = self.addresses.get(address)
+        if entry is None:
+            host, port = address
+            sockaddr = bytearray(
+                struct.pack("=H", socket.AF_INET)
+                + struct.pack("!H", port)
+                + socket.inet_aton(host)
+                + bytes(8)
+            )
+            entry = self.addresses[address] = (sockaddr, _address_of(sockaddr))
+        return entry[1]
+
+    def send(self, messages):
+        """
+        Envia a lista de (dados, endereço). Retorna quantas mensagens, do início da
+        lista, foram enviadas; levanta BlockingIOError se nenhuma coube no buffer
+        do socket (não bloqueante).
+        """
+        if not self.batched:
+            sent = 0
+            for data, address in messages:
+                try:
+                    self.sock.sendto(data, address)
+                except BlockingIOError:
+                    if not sent:
+                        raise
+                    break
+                sent += 1
+            return sent
+
+        # Os cabeçalhos do lote apontam para os sockaddr em cache: só esvazia o
+        # cache entre lotes, nunca com um lote em montagem
+        if len(self.addresses) > 4096:
+            self.addresses.clear()
+        arena = self.arena
+        arena_size = len(arena)
+        iovecs = self.iovecs
+        headers = self.headers
+        offset = 0
+        count = 0
+        last_address = None
+        for data, address in messages:
+            size = len(data)
+            if count == MAX_BATCH or (count and offset + size > arena_size):
+                break
+            arena[offset : offset + size] = data
+            IOVEC.pack_into(
+                iovecs, count * IOVEC.size, self.arena_address + offset, size
+            )
+            if address != last_address:
+                sockaddr = self._sockaddr(address)
+                last_address = address
+            POINTER.pack_into(headers, count * MMSGHDR_SIZE, sockaddr)
+            offset += size
+            count += 1
+        if not count:
+            return 0
+        sent = libc.sendmmsg(self.sock.fileno(), self.headers_address, count, 0)
+        if sent < 0:
+            _raise_errno()
+        return sent
+
+
+class Receiver:
+    """
+    Recepção em lote em buffers pré-alocados. receive() devolve uma lista de
+    (memoryview do datagrama, endereço); os buffers são reutilizados na chamada
+    seguinte. Levanta BlockingIOError se não houver datagramas esperando.
+    """
+
+    def __init__(self, sock, buffer_size, batch, batched=True):
+        self.sock = sock
+        self.batched = batched and batching(sock)
+        self.batch = min(max(batch, 1), MAX_BATCH)
+        if not self.batched:
+            self.view = memoryview(bytearray(buffer_size))
+            return
+        self.buffer = bytearray(buffer_size * self.batch)
+        self.view = memoryview(self.buffer)
+        self.buffer_size = buffer_size
+        self.names = bytearray(SOCKADDR_IN_SIZE * self.batch)
+        self.iovecs = bytearray(IOVEC.size * self.batch)
+        self.headers = bytearray(MMSGHDR_SIZE * self.batch)
+        buffer_address = _address_of(self.buffer)
+        names_address = _address_of(self.names)
+        iovecs_address = _address_of(self.iovecs)
+        self.headers_address = _address_of(self.headers)
+        for i in range(self.batch):
+            address = buffer_address + i * buffer_size
+            IOVEC.pack_into(self.iovecs, i * IOVEC.size, address, buffer_size)
+            MSGHDR.pack_into(
+                self.headers,
+                i * MMSGHDR_SIZE,
+                names_address + i * SOCKADDR_IN_SIZE,
+                SOCKADDR_IN_SIZE,
+                iovecs_address + i * IOVEC.size,
+                1,
+            )
+
+    def receive(self):
+        if not self.batched:
+            nbytes, address = self.sock.recvfrom_into(self.view)
+            return [(self.view[:nbytes], address)]
+
+        # O kernel grava em msg_namelen o tamanho real do endereço, que para IPv4
+        # é sempre SOCKADDR_IN_SIZE: não é preciso restaurá-lo a cada chamada
+        received = libc.recvmmsg(
+            self.sock.fileno(), self.headers_address, self.batch, MSG_DONTWAIT, None
+        )
+        if received < 0:
+            _raise_errno()
+        datagrams = []
+        for i in range(received):
+            (length,) = struct.unpack_from(
+                "I", self.headers, i * MMSGHDR_SIZE + MSG_LEN_OFFSET
+            )
+            name = i * SOCKADDR_IN_SIZE
+            (port,) = struct.unpack_from("!H", self.names, name + 2)
+            host = socket.inet_ntoa(self.names[name + 4 : name + 8])
+            start = i * self.buffer_size
+            datagrams.append((self.view[start : start + length], (host, port)))
+        return datagrams
@@ -0,0 +1,237 @@
+import bisect
+import hashlib
+import struct
+import zlib
+
+try:
+    import xxhash
+except ImportError:  # Opcional: sem ele o xxh32 simplesmente não é oferecido
+    xxhash = None
+
+# Formato binário dos pacotes de dados, compartilhado entre cliente e servidor.
+# Cabeçalho de tamanho fixo (12 bytes, ordem de rede):
+#   versão (1 byte) | flags (1 byte) | tamanho do payload (2 bytes) |
+#   número do chunk (4 bytes) | checksum do payload (4 bytes)
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("!BBHII")
+HEADER_SIZE = HEADER.size
+
+FLAG_EOF = 0x01  # Fim da transmissão (sem payload)
+FLAG_PARITY = 0x02  # Paridade FEC: o campo do chunk leva o número do bloco
+
+# Limites do tamanho de chunk negociado no GET
+DEFAULT_CHUNK_SIZE = 1024  # Usado quando o cliente não propõe um tamanho
+MIN_CHUNK_SIZE = 512
+MAX_UDP_PAYLOAD = 65507  # Maior datagrama UDP sobre IPv4
+MAX_CHUNK_SIZE = MAX_UDP_PAYLOAD - HEADER_SIZE
+
+
+def clamp_chunk_size(chunk_size):
+    return min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+
+def parse_options(tokens):
+    """Converte tokens "chave=valor" de uma requisição/resposta em dicionário."""
+    return dict(token.split("=", 1) for token in tokens if "=" in token)
+
+
+def format_options(options):
+    return " ".join(f"{key}={value}" for key, value in options.items())
+
+
+def format_ranges(ranges):
+    """Intervalos inclusivos em texto ("0-9,15-20,30-"); fim None = até o final."""
+    return ",".join(f"{first}-{'' if last is None else last}" for first, last in ranges)
+
+
+def parse_ranges(text):
+    """Inverso de format_ranges. Levanta ValueError se o texto for inválido."""
+    ranges = []
+    for item in text.split(","):
+        first, last = item.split("-")
+        ranges.append((int(first), int(last) if last else None))
+    return ranges
+
+
+def create_checksum(data):
+    """Checksum compacto (32 bits) do payload: os 4 primeiros bytes do MD5."""
+    return int.from_bytes(hashlib.md5(data).digest()[:4], "big")
+
+
+# Verificação de integridade escolhida no GET ("check=a,b,..." em ordem de
+# preferência): checksums de 32 bits por chunk, no campo do cabeçalho. O MD5
+# truncado é o padrão para clientes que não propõem nada; CRC32 e xxh32 custam
+# uma fração dele por pacote (ver benchmark.py --checksums).
+CHECKSUMS = {
+    "md5": create_checksum,
+    "crc32": zlib.crc32,
+    "adler32": zlib.adler32,
+}
+if xxhash is not None:
+    CHECKSUMS["xxh32"] = xxhash.xxh32_intdigest
+DEFAULT_CHECKSUM = "md5"
+
+# Hash do arquivo inteiro, enviado uma vez no OK e conferido pelo cliente no fim
+# ("digest=a,b,..."). Também identifica a versão do arquivo na retomada.
+DIGESTS = ("md5", "sha1", "sha256", "blake2b")
+DEFAULT_DIGEST = "md5"
+
+
+def choose(proposal, supported, default):
+    """Primeira opção de `proposal` ("a,b,c") que está em `supported`."""
+    if proposal is None:
+        return default
+    for name in proposal.split(","):
+        if name in supported:
+            return name
+    return default
+
+
+def pack_chunk(buffer, f, chunk_num, chunk_size, checksum=create_checksum):
+    """
+    Lê o chunk `chunk_num` de `f` direto em `buffer`, depois do espaço do cabeçalho,
+    preenche o cabeçalho e retorna uma memoryview do pacote pronto para envio.
+    """
+    view = memoryview(buffer)
+    f.seek(chunk_num * chunk_size)
+    length = f.readinto(view[HEADER_SIZE : HEADER_SIZE + chunk_size])
+    payload = view[HEADER_SIZE : HEADER_SIZE + length]
+    HEADER.pack_into(
+        buffer, 0, PROTOCOL_VERSION, 0, length, chunk_num, checksum(payload)
+    )
+    return view[: HEADER_SIZE + length]
+
+
+def build_parity(block, parity, chunk_size, checksum=create_checksum):
+    """
+    Pacote de paridade do bloco `block`: XOR dos payloads do bloco, acumulado como
+    inteiro little-endian (chunks menores equivalem a chunks completados com zeros).
+    """
+    payload = parity.to_bytes(chunk_size, "little")
+    header = HEADER.pack(
+        PROTOCOL_VERSION,
+        FLAG_PARITY,
+        chunk_size,
+        block,
+        checksum(payload),
+    )
+    return header + payload
+
+
+def build_eof(resend_round):
+    """EOF: o campo do chunk leva a rodada de retransmissão (0 no envio inicial)."""
+    return HEADER.pack(PROTOCOL_VERSION, FLAG_EOF, 0, resend_round, 0)
+
+
+def parse_packet(view, nbytes):
+    """
+    Interpreta um pacote recebido em `view` (memoryview do buffer de recepção) sem
+    copiar o payload. Retorna (flags, chunk, checksum, payload) ou None se os
+    `nbytes` recebidos não formam um pacote de dados válido desta versão.
+    """
+    if nbytes < HEADER_SIZE:
+        return None
+    version, flags, length, chunk_num, checksum = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION or HEADER_SIZE + length != nbytes:
+        return None
+    return flags, chunk_num, checksum, view[HEADER_SIZE:nbytes]
+
+
+# Relatório de perdas: lista compacta de chunks faltantes, usada no RESEND do modo
+# BLAST e nos ACKs do modo WINDOW. Cabeçalho: codificação | base | contagem.
+REPORT = struct.Struct("!BII")
+ENCODING_RANGES = 0  # Corpo: `contagem` intervalos (início, fim) inclusivos
+ENCODING_BITMAP = 1  # Corpo: `contagem` bits; bit i ligado = chunk base + i falta
+RANGE = struct.Struct("!II")
+MAX_REPORT_SIZE = 1400  # Cabe em um datagrama sem fragmentação IP
+REPORT_SPAN = (MAX_REPORT_SIZE - REPORT.size) * 8  # Chunks que um bitmap cobre
+
+# Prefixos binários das mensagens do cliente que carregam um relatório
+ACK = struct.Struct("!II")  # Cumulativo (anteriores já recebidos) | maior recebido
+RESEND = struct.Struct("!HB")  # Rodada de retransmissão | último relatório da rodada
+
+
+def _runs(values, start, max_runs):
+    """
+    Agrupa values[start:] (ordenado) em até `max_runs` intervalos contíguos
+    inclusivos. Retorna (intervalos, índice do primeiro valor não coberto).
+    """
+    runs = []
+    i = start
+    while i < len(values) and len(runs) < max_runs:
+        first = values[i]
+        while i + 1 < len(values) and values[i + 1] == values[i] + 1:
+            i += 1
+        runs.append((first, values[i]))
+        i += 1
+    return runs, i
+
+
+def missing_ranges(missing, max_ranges):
+    """
+    Resume a lista ordenada `missing` em até `max_ranges` intervalos. Se não
+    couberem todos, o último fica aberto (fim None) e cobre o resto do arquivo.
+    """
+    ranges, end = _runs(missing, 0, max_ranges)
+    if end < len(missing):
+        ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def encode_loss_report(missing, max_size=MAX_REPORT_SIZE):
+    """
+    Codifica a lista ordenada `missing` em relatórios de até `max_size` bytes.
+    Cada relatório usa a codificação que cobre mais chunks: intervalos para perdas
+    em rajada, bitmap para perdas espalhadas (cada byte cobre 8 chunks).
+    """
+    if not missing:
+        return [REPORT.pack(ENCODING_RANGES, 0, 0)]
+    reports = []
+    capacity = max_size - REPORT.size
+    i = 0
+    while i < len(missing):
+        ranges, ranges_end = _runs(missing, i, capacity // RANGE.size)
+
+        # O bitmap cobre os faltantes a até capacity * 8 chunks da base
+        base = missing[i]
+        bitmap_end = bisect.bisect_left(missing, base + capacity * 8, i)
+        bitmap_bits = missing[bitmap_end - 1] - base + 1
+        bitmap_size = (bitmap_bits + 7) // 8
+
+        if bitmap_end > ranges_end or (
+            bitmap_end == ranges_end and bitmap_size < len(ranges) * RANGE.size
+        ):
+            bitmap = bytearray(bitmap_size)
+            for chunk_num in missing[i:bitmap_end]:
+                offset = chunk_num - base
+                bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+            reports.append(REPORT.pack(ENCODING_BITMAP, base, bitmap_bits) + bitmap)
+            i = bitmap_end
+        else:
+            body = b"".join(RANGE.pack(first, last) for first, last in ranges)
+            reports.append(REPORT.pack(ENCODING_RANGES, base, len(ranges)) + body)
+            i = ranges_end
+    return reports
+
+
+def decode_loss_report(report):
+    """Decodifica um relatório em intervalos (início, fim) inclusivos de faltantes."""
+    encoding, base, count = REPORT.unpack_from(report)
+    body = memoryview(report)[REPORT.size :]
+    if encoding == ENCODING_RANGES:
+        if len(body) < count * RANGE.size:
+            raise ValueError("relatório de intervalos truncado")
+        return [RANGE.unpack_from(body, k * RANGE.size) for k in range(count)]
+    if encoding == ENCODING_BITMAP:
+        size = (count + 7) // 8
+        if len(body) < size:
+            raise ValueError("bitmap truncado")
+        missing = [
+            base + (index << 3) + bit
+            for index, byte in enumerate(body[:size])
+            if byte
+            for bit in range(8)
+            if byte & (0x80 >> bit)
+        ]
+        return _runs(missing, 0, len(missing))[0]
+    raise ValueError(f"codificação de relatório desconhecida: {encoding}")
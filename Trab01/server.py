@@ -1,111 +1,1047 @@
 import socket
 import os
-import hashlib
+import logging
+import struct
+import time
+import selectors
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import digest_cache
+import mmsg
+import protocol
 
 # Configuração do Servidor
 SERVER_IP = "0.0.0.0"  # Escuta em todas as interfaces de rede
 SERVER_PORT = 12345
-CHUNK_SIZE = 1024  # Tamanho de cada chunk (1 KB)
-BUFFER_SIZE = 2048  # Deve ser >= CHUNK_SIZE + tamanho do cabeçalho
+LOG_LEVEL = "INFO"  # DEBUG registra cada chunk enviado (caro em altas taxas)
+MAX_CHUNK_SIZE = protocol.MAX_CHUNK_SIZE  # Maior chunk aceito na negociação do GET
+BUFFER_SIZE = 2048  # Tamanho máximo de uma requisição de cliente
+SEND_BUFFER_BYTES = 4 * 1024 * 1024  # SO_SNDBUF pedido ao sistema
 
+# Configuração do envio com janela deslizante (modo WINDOW)
+WINDOW_SIZE = 256  # Máximo de chunks em voo (sem ACK) por cliente
+INITIAL_WINDOW = 4  # Janela de congestionamento inicial (em chunks)
+DUP_THRESHOLD = 3  # Envios posteriores confirmados para considerar um chunk perdido
+INITIAL_RTO = 0.2  # Timeout de retransmissão inicial (em segundos)
+MIN_RTO = 0.02
+MAX_RTO = 2.0
+MAX_TIMEOUTS = 8  # Timeouts consecutivos sem progresso antes de desistir
 
-def create_checksum(data):
-    return hashlib.md5(data).hexdigest()
+# Configuração do escalonador de transferências simultâneas
+QUANTUM = 8  # Chunks enviados por sessão a cada rodada do rodízio
+READ_BATCH = 64  # Máximo de datagramas lidos antes de voltar a enviar
+BATCH_IO = True  # Envia/recebe vários datagramas por chamada (sendmmsg/recvmmsg)
+SESSION_TIMEOUT = 120  # Sessões ociosas por mais tempo (s) são descartadas
 
+# Correção de erros (FEC): um pacote de paridade XOR a cada `fec` chunks pedidos
+MIN_FEC_BLOCK = 2
+MAX_FEC_BLOCK = 64
 
-def main():
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    server_socket.bind((SERVER_IP, SERVER_PORT))
-    print(f"Servidor ouvindo na porta {SERVER_PORT}")
-
-    client_files = {}  # Dicionário para mapear cliente ao arquivo
-
-    while True:
-        server_socket.settimeout(None)
-        print("\nAguardando nova requisição de cliente...")
-        message, client_address = server_socket.recvfrom(BUFFER_SIZE)
-        request = message.decode()
-
-        if request.startswith("GET"):
-            _, filename = request.split()
-            if os.path.isfile(filename):
-                # Enviar confirmação e número total de chunks
-                server_socket.sendto(b"OK", client_address)
-                file_size = os.path.getsize(filename)
-                total_chunks = file_size // CHUNK_SIZE + (file_size % CHUNK_SIZE > 0)
-                server_socket.sendto(str(total_chunks).encode(), client_address)
-                print(
-                    f"Cliente {client_address} requisitou o arquivo '{filename}'. Total de chunks a enviar: {total_chunks}"
+
+logger = logging.getLogger(__name__)
+
+# Cache de pacotes prontos, compartilhado por todas as sessões
+PACKET_CACHE_BYTES = 64 * 1024 * 1024  # Limite de memória do cache (0: desligado)
+
+
+class PacketCache:
+    """
+    Cache LRU de pacotes prontos (cabeçalho + payload), indexado por versão do
+    arquivo, tamanho de chunk, checksum e número do chunk. Retransmissões e
+    clientes baixando o mesmo arquivo reaproveitam a leitura e o checksum.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.packets = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        packet = self.packets.get(key)
+        if packet is None:
+            self.misses += 1
+            return None
+        self.packets.move_to_end(key)
+        self.hits += 1
+        return packet
+
+    def accepts(self, size):
+        """Se um pacote de `size` bytes pode entrar no cache."""
+        return size <= self.max_bytes
+
+    def put(self, key, packet):
+        if len(packet) > self.max_bytes:
+            return
+        self.packets[key] = packet
+        self.size += len(packet)
+        while self.size > self.max_bytes:
+            _, evicted = self.packets.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{self.hits / lookups if lookups else 0:.3f}",
+            "evictions": self.evictions,
+            "packets": len(self.packets),
+            "bytes": self.size,
+        }
+
+
+class FilePool:
+    """
+    Arquivos abertos compartilhados entre sessões, por versão do arquivo (caminho,
+    tamanho, mtime). Cada arquivo fica aberto enquanto alguma sessão o usa; como o
+    laço de eventos é único, o par seek/read de uma sessão nunca é intercalado.
+    """
+
+    def __init__(self):
+        self.files = {}  # versão do arquivo -> [arquivo, sessões usando]
+
+    def acquire(self, file_key):
+        entry = self.files.get(file_key)
+        if entry is None:
+            entry = self.files[file_key] = [open(file_key[0], "rb"), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, file_key):
+        entry = self.files[file_key]
+        entry[1] -= 1
+        if not entry[1]:
+            entry[0].close()
+            del self.files[file_key]
+
+
+packet_cache = PacketCache(PACKET_CACHE_BYTES)
+file_pool = FilePool()
+
+
+class PacketSource:
+    """
+    Pacotes de dados de um arquivo com os parâmetros de uma sessão. Com o cache
+    de pacotes, cada pacote é montado direto no buffer que fica guardado nele.
+    Sem o cache, os pacotes são montados em um anel de QUANTUM buffers da sessão:
+    o Outbox é esvaziado antes de cada rodada do rodízio, e a sessão enfileira no
+    máximo QUANTUM chunks por rodada, então nenhum buffer é reusado com o pacote
+    anterior ainda na fila.
+    """
+
+    def __init__(self, f, file_key, chunk_size, check):
+        self.file = f
+        self.chunk_size = chunk_size
+        self.checksum = protocol.CHECKSUMS[check]
+        self.key = (file_key, chunk_size, check)
+        self.cached = packet_cache.accepts(protocol.HEADER_SIZE + chunk_size)
+        self.buffers = []
+        if not self.cached:
+            self.buffers = [
+                bytearray(protocol.HEADER_SIZE + chunk_size) for _ in range(QUANTUM)
+            ]
+        self.next_buffer = 0
+
+    def packet(self, chunk_num):
+        if not self.cached:
+            buffer = self.buffers[self.next_buffer]
+            self.next_buffer = (self.next_buffer + 1) % QUANTUM
+            return protocol.pack_chunk(
+                buffer, self.file, chunk_num, self.chunk_size, self.checksum
+            )
+        key = self.key + (chunk_num,)
+        packet = packet_cache.get(key)
+        if packet is None:
+            buffer = bytearray(protocol.HEADER_SIZE + self.chunk_size)
+            packet = protocol.pack_chunk(
+                buffer, self.file, chunk_num, self.chunk_size, self.checksum
+            )
+            packet_cache.put(key, packet)
+        return packet
+
+
+class Outbox:
+    """
+    Fila de datagramas de saída com a interface de sendto. Os envios das sessões
+    enfileiram aqui, e o escalonador entrega tudo ao socket em lotes (sendmmsg)
+    ao fim de cada rodada. O que não couber no buffer do socket fica na fila, na
+    mesma ordem, para a próxima entrega.
+    """
+
+    def __init__(self, sock, batched=BATCH_IO):
+        self.sock = sock
+        self.sender = mmsg.Sender(sock) if batched else None
+        self.queue = []  # (dados, endereço)
+
+    def sendto(self, data, address):
+        self.queue.append((data, address))
+
+    def flush(self):
+        """Entrega a fila; levanta BlockingIOError se o buffer do socket encher."""
+        done = 0
+        try:
+            while done < len(self.queue):
+                if self.sender is None:
+                    self.sock.sendto(*self.queue[done])
+                    done += 1
+                else:
+                    batch = self.queue[done : done + mmsg.MAX_BATCH]
+                    done += self.sender.send(batch)
+        finally:
+            del self.queue[:done]
+
+
+def send_chunk(outbox, source, chunk_num, client_address):
+    """Enfileira um chunk na Outbox do servidor. Retorna o payload do pacote."""
+    packet = source.packet(chunk_num)
+    outbox.sendto(packet, client_address)
+    return packet[protocol.HEADER_SIZE :]
+
+
+# Hashes dos arquivos servidos, um cache por algoritmo aceito no GET
+digests = {name: digest_cache.DigestCache(algorithm=name) for name in protocol.DIGESTS}
+
+
+def file_identity(key, digest):
+    """
+    Identidade do arquivo anunciada no OK: tamanho, mtime (ns) e hash do conteúdo
+    da versão `key` (chave do digest_cache). O cliente confere o hash no fim da
+    transferência e guarda a identidade no journal para saber se um download
+    parcial ainda vale.
+    """
+    return {"size": key[1], "mtime": key[2], "hash": digest}
+
+
+def requested_chunks(options, total_chunks):
+    """
+    Chunks a enviar: todos, ou só os dos intervalos de "missing=" (retomada de um
+    download parcial). Levanta ValueError se os intervalos forem inválidos.
+    """
+    if "missing" not in options:
+        return range(total_chunks)
+    chunks = []
+    for first, last in protocol.parse_ranges(options["missing"]):
+        end = total_chunks if last is None else min(last + 1, total_chunks)
+        chunks.extend(range(first, end))
+    return chunks
+
+
+def negotiate_chunk_size(options):
+    """Tamanho de chunk proposto pelo cliente ("chunk=N"), limitado ao aceito aqui."""
+    try:
+        chunk_size = int(options.get("chunk", protocol.DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        chunk_size = protocol.DEFAULT_CHUNK_SIZE
+    return min(protocol.clamp_chunk_size(chunk_size), MAX_CHUNK_SIZE)
+
+
+def negotiate_window(options):
+    """Janela máxima: a anunciada pelo cliente ("window=N"), até WINDOW_SIZE."""
+    try:
+        return min(max(int(options.get("window", WINDOW_SIZE)), 1), WINDOW_SIZE)
+    except ValueError:
+        return WINDOW_SIZE
+
+
+def negotiate_fec(options):
+    """Chunks por paridade pedidos pelo cliente ("fec=N"); 0 desliga o FEC."""
+    try:
+        fec_block = int(options.get("fec", 0))
+    except ValueError:
+        return 0
+    if fec_block < MIN_FEC_BLOCK:
+        return 0
+    return min(fec_block, MAX_FEC_BLOCK)
+
+
+def parse_ack(message):
+    """
+    Interpreta um ACK: "ACK" + cumulativo (todos os chunks anteriores recebidos)
+    + maior chunk recebido + relatório dos faltantes entre os dois. Retorna
+    (cumulativo, intervalos inclusivos recebidos fora de ordem).
+    """
+    body = memoryview(message)[len(b"ACK") :]
+    cumulative, highest = protocol.ACK.unpack_from(body)
+    missing = protocol.decode_loss_report(body[protocol.ACK.size :])
+    ranges = []
+    start = cumulative + 1  # O próprio cumulativo é o primeiro faltante
+    for first, last in missing:
+        if first > start:
+            ranges.append((start, first - 1))
+        start = max(start, last + 1)
+    if start <= highest:
+        ranges.append((start, highest))
+    return cumulative, ranges
+
+
+def parse_resend(message):
+    """
+    Interpreta um RESEND: "RESEND" + rodada + flag de último relatório da rodada +
+    relatório dos faltantes. Retorna (rodada, último, intervalos faltantes).
+    """
+    body = memoryview(message)[len(b"RESEND") :]
+    resend_round, last = protocol.RESEND.unpack_from(body)
+    missing = protocol.decode_loss_report(body[protocol.RESEND.size :])
+    return resend_round, bool(last), missing
+
+
+class ParityEncoder:
+    """
+    Acumula a paridade XOR dos chunks enviados pela primeira vez, em ordem. Ao
+    completar um bloco de `fec_block` chunks (ou no último chunk do arquivo), o
+    pacote de paridade do bloco entra em `pending` até ser enviado.
+    """
+
+    def __init__(self, fec_block, chunk_size, total_chunks, checksum):
+        self.fec_block = fec_block
+        self.chunk_size = chunk_size
+        self.total_chunks = total_chunks
+        self.checksum = checksum
+        self.parity = 0
+        self.pending = deque()  # (bloco, pacote de paridade)
+
+    def add(self, chunk_num, payload):
+        self.parity ^= int.from_bytes(payload, "little")
+        if (
+            chunk_num % self.fec_block == self.fec_block - 1
+            or chunk_num == self.total_chunks - 1
+        ):
+            block = chunk_num // self.fec_block
+            packet = protocol.build_parity(
+                block, self.parity, self.chunk_size, self.checksum
+            )
+            self.pending.append((block, packet))
+            self.parity = 0
+
+
+class BlastSender:
+    """
+    Envio legado: manda os chunks da fila sem esperar ACKs. Usado no GET simples
+    (todos os chunks, com paridades FEC se pedidas) e no RESEND (apenas os chunks
+    pedidos).
+    """
+
+    def __init__(self, outbox, client_address, source, chunks, fec=None):
+        self.outbox = outbox
+        self.client_address = client_address
+        self.source = source  # PacketSource da sessão
+        self.queue = deque(chunks)
+        self.fec = fec  # ParityEncoder, ou None sem FEC
+        self.awaiting_more = False  # Faltam relatórios da rodada de RESEND
+        self.packets_sent = 0
+        self.retransmissions = 0
+
+    def done(self):
+        return not self.can_send() and not self.awaiting_more
+
+    def can_send(self):
+        return bool(self.queue) or bool(self.fec and self.fec.pending)
+
+    def pump(self, budget):
+        sent = 0
+        while sent < budget:
+            if self.fec and self.fec.pending:
+                self.outbox.sendto(self.fec.pending[0][1], self.client_address)
+                self.fec.pending.popleft()
+            elif self.queue:
+                chunk_num = self.queue[0]
+                payload = send_chunk(
+                    self.outbox, self.source, chunk_num, self.client_address
                 )
+                self.queue.popleft()
+                if self.fec:
+                    self.fec.add(chunk_num, payload)
+                logger.debug("Enviado chunk %d", chunk_num)
+            else:
+                break
+            self.packets_sent += 1
+            sent += 1
+        return sent
+
+    def next_timeout(self):
+        return None
+
+
+class WindowSender:
+    """
+    Envio com repetição seletiva para um cliente. Mantém até `cwnd` chunks em voo,
+    avança a janela com ACKs cumulativos/seletivos e ajusta `cwnd` por AIMD:
+    cresce a cada chunk confirmado e cai pela metade a cada evento de perda.
+    Com FEC, um chunk só é dado como perdido depois que a paridade do seu bloco
+    teve a chance de chegar, pois o cliente pode reconstruí-lo sozinho.
+    """
+
+    def __init__(
+        self,
+        outbox,
+        client_address,
+        source,
+        total_chunks,
+        max_window=WINDOW_SIZE,
+        fec=None,
+        chunks=None,
+    ):
+        self.outbox = outbox
+        self.client_address = client_address
+        self.source = source  # PacketSource da sessão
+        self.total_chunks = total_chunks
+        self.max_window = max_window
+        self.cwnd = float(min(INITIAL_WINDOW, max_window))
+        self.ssthresh = float(max_window)
+        self.acked = bytearray(total_chunks)
+        if chunks is not None:
+            # Retomada: os chunks que o cliente já tem contam como confirmados
+            self.acked = bytearray(b"\x01") * total_chunks
+            for chunk_num in chunks:
+                self.acked[chunk_num] = 0
+        self.base = 0  # Menor chunk ainda sem ACK
+        self.next_chunk = 0  # Próximo chunk ainda não enviado nenhuma vez
+        self._skip_acked()
+        self.in_flight = {}  # chunk -> (ordem do envio, instante do envio)
+        self.lost = deque()  # Chunks marcados como perdidos, aguardando reenvio
+        self.retransmitted = set()
+        self.recovery_point = 0
+        self.send_counter = 0
+        self.highest_acked_send = -1
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+        self.timeouts = 0
+        self.fec = fec  # ParityEncoder, ou None sem FEC
+        self.parity_sent = {}  # bloco -> ordem do envio da paridade
+        self.packets_sent = 0
+        self.retransmissions = 0
+
+    def done(self):
+        return self.base >= self.total_chunks
+
+    def _skip_acked(self):
+        while self.base < self.total_chunks and self.acked[self.base]:
+            self.base += 1
+        self.next_chunk = max(self.next_chunk, self.base)
+        while self.next_chunk < self.total_chunks and self.acked[self.next_chunk]:
+            self.next_chunk += 1
 
-                # Armazenar o nome do arquivo associado ao cliente
-                client_files[client_address] = filename
-
-                # Envio dos chunks do arquivo
-                with open(filename, "rb") as f:
-                    chunk_num = 0
-                    while True:
-                        chunk_data = f.read(CHUNK_SIZE)
-                        if not chunk_data:
-                            break
-                        checksum = create_checksum(chunk_data)
-                        header = f"{chunk_num}|{checksum}|".encode()
-                        packet = header + chunk_data
-
-                        # Envia o pacote
-                        server_socket.sendto(packet, client_address)
-                        print(f"Enviado chunk {chunk_num}/{total_chunks - 1}")
-                        chunk_num += 1
-
-                # Envia o pacote EOF
-                eof_packet = b"EOF"
-                server_socket.sendto(eof_packet, client_address)
-                print("Pacote EOF enviado.")
+    def can_send(self):
+        if self.fec and self.fec.pending:
+            return True
+        if len(self.in_flight) >= int(self.cwnd):
+            return False
+        return bool(self.lost) or self.next_chunk < self.total_chunks
+
+    def send_chunk(self, chunk_num):
+        payload = send_chunk(self.outbox, self.source, chunk_num, self.client_address)
+        self.in_flight[chunk_num] = (self.send_counter, time.monotonic())
+        self.send_counter += 1
+        self.packets_sent += 1
+        return payload
+
+    def pump(self, budget):
+        """Envia até `budget` chunks (retransmissões primeiro) se houver janela."""
+        sent = 0
+        while sent < budget:
+            if self.fec and self.fec.pending:
+                # As paridades não ocupam a janela: são poucas e não recebem ACK
+                block, packet = self.fec.pending[0]
+                self.outbox.sendto(packet, self.client_address)
+                self.fec.pending.popleft()
+                self.parity_sent[block] = self.send_counter
+                self.send_counter += 1
+                self.packets_sent += 1
+            elif len(self.in_flight) >= int(self.cwnd):
+                break
+            elif self.lost:
+                chunk_num = self.lost[0]
+                if self.acked[chunk_num] or chunk_num in self.in_flight:
+                    self.lost.popleft()
+                    continue
+                self.send_chunk(chunk_num)
+                self.lost.popleft()
+                self.retransmitted.add(chunk_num)
+                self.retransmissions += 1
+            elif self.next_chunk < self.total_chunks:
+                payload = self.send_chunk(self.next_chunk)
+                if self.fec:
+                    self.fec.add(self.next_chunk, payload)
+                self.next_chunk += 1
+                self._skip_acked()
             else:
+                break
+            sent += 1
+        return sent
+
+    def on_ack(self, cumulative, ranges):
+        now = time.monotonic()
+        newly_acked = 0
+        for chunk_num in range(self.base, min(cumulative, self.total_chunks)):
+            newly_acked += self._mark_acked(chunk_num, now)
+        for start, end in ranges:
+            end = min(end + 1, self.total_chunks)
+            for chunk_num in range(max(start, self.base), end):
+                newly_acked += self._mark_acked(chunk_num, now)
+
+        while self.base < self.total_chunks and self.acked[self.base]:
+            self.base += 1
+
+        if newly_acked:
+            self.timeouts = 0
+
+        # Chunks enviados antes de DUP_THRESHOLD envios já confirmados são dados como
+        # perdidos e vão para a fila de retransmissão sem esperar o timeout
+        lost = [
+            chunk_num
+            for chunk_num, (order, _) in self.in_flight.items()
+            if order + DUP_THRESHOLD <= self.highest_acked_send
+            and self._parity_delivered(chunk_num)
+        ]
+        for chunk_num in sorted(lost):
+            del self.in_flight[chunk_num]
+            self.lost.append(chunk_num)
+            self._on_loss(chunk_num)
+
+    def _parity_delivered(self, chunk_num):
+        """
+        Sem FEC, ou para chunks já retransmitidos, sempre verdadeiro. Caso contrário,
+        verdadeiro se algum envio posterior à paridade do bloco já foi confirmado.
+        """
+        if not self.fec or chunk_num in self.retransmitted:
+            return True
+        order = self.parity_sent.get(chunk_num // self.fec.fec_block)
+        return order is not None and order < self.highest_acked_send
+
+    def _mark_acked(self, chunk_num, now):
+        if self.acked[chunk_num]:
+            return 0
+        self.acked[chunk_num] = 1
+        sent = self.in_flight.pop(chunk_num, None)
+        if sent is not None:
+            order, sent_at = sent
+            self.highest_acked_send = max(self.highest_acked_send, order)
+            # Algoritmo de Karn: só mede RTT de chunks enviados uma única vez
+            if chunk_num not in self.retransmitted:
+                self._update_rtt(now - sent_at)
+
+        # Crescimento da janela: exponencial até ssthresh, depois linear
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+        return 1
+
+    def _update_rtt(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(max(self.srtt + 4 * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def _on_loss(self, chunk_num):
+        # Uma única redução por janela: perdas de chunks enviados antes da última
+        # redução pertencem ao mesmo evento de congestionamento
+        if chunk_num >= self.recovery_point:
+            self.ssthresh = max(self.cwnd / 2, 2.0)
+            self.cwnd = self.ssthresh
+            self.recovery_point = self.next_chunk
+
+    def next_timeout(self):
+        """Tempo (s) até expirar o RTO do chunk em voo mais antigo."""
+        if not self.in_flight:
+            return None
+        _, sent_at = next(iter(self.in_flight.values()))
+        return max(sent_at + self.rto - time.monotonic(), 0.0)
+
+    def on_timeout(self):
+        """Retransmite tudo o que está em voo e volta a janela para 1 chunk."""
+        self.lost.extend(sorted(self.in_flight))
+        self.in_flight.clear()
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = 1.0
+        self.recovery_point = self.next_chunk
+        self.rto = min(self.rto * 2, MAX_RTO)
+        self.timeouts += 1
+        return self.timeouts
+
+
+class Session:
+    """Entrada da tabela de sessões: a transferência de um arquivo a um cliente."""
+
+    def __init__(self, client_address, file_key, chunk_size, total_chunks, check):
+        self.client_address = client_address
+        self.file_key = file_key  # (caminho, tamanho, mtime em ns)
+        self.filename = file_key[0]
+        self.chunk_size = chunk_size
+        self.total_chunks = total_chunks
+        self.check = check  # Checksum por chunk negociado no GET
+        self.request = None  # GET que abriu a sessão, para reconhecer repetições
+        self.source = None  # PacketSource enquanto a sessão usa o arquivo
+        self.sender = None  # Envio em andamento (None quando ociosa)
+        self.resend_round = 0  # Rodada de RESEND atual (0: envio inicial)
+        self.eof_pending = False
+        self.started_at = time.monotonic()
+        self.last_activity = self.started_at
+
+    def start(self, sender_factory):
+        if self.source is None:
+            self.source = PacketSource(
+                file_pool.acquire(self.file_key),
+                self.file_key,
+                self.chunk_size,
+                self.check,
+            )
+        self.sender = sender_factory(self.source)
+        self.eof_pending = False
+        self.started_at = time.monotonic()
+
+    def close(self):
+        if self.source is not None:
+            file_pool.release(self.file_key)
+            self.source = None
+        self.sender = None
+
+
+class Server:
+    """
+    Servidor de arquivos UDP com laço de eventos (selectors): uma tabela de sessões
+    indexada pelo endereço do cliente e um escalonador em rodízio que intercala os
+    chunks de todas as transferências ativas no mesmo socket.
+    """
+
+    def __init__(self, server_socket):
+        self.sock = server_socket
+        self.sock.setblocking(False)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.outbox = Outbox(self.sock, BATCH_IO)
+        self.inbox = None
+        if BATCH_IO:
+            self.inbox = mmsg.Receiver(self.sock, BUFFER_SIZE, READ_BATCH)
+        self.sessions = {}  # endereço do cliente -> Session
+        self.active = deque()  # Sessões com envio em andamento, em ordem de rodízio
+        self.write_blocked = False
+        self.last_sweep = time.monotonic()
+        # Hashes de arquivo calculados em uma thread, para não parar as outras
+        # sessões: cada GET espera o hash da sua versão e é refeito quando ele
+        # fica pronto. A thread acorda o laço pelo par de sockets `wakeup`
+        self.hasher = ThreadPoolExecutor(1, thread_name_prefix="hash")
+        self.hashing = {}  # (algoritmo, versão) -> {endereço do cliente: GET}
+        self.hashed = deque()  # (algoritmo, versão, Future) concluídos
+        self.wakeup, self.wakeup_writer = socket.socketpair()
+        self.wakeup.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        while True:
+            events = self.selector.select(self._next_wakeup())
+            for key, mask in events:
+                if key.fileobj is self.wakeup:
+                    self._finish_hashes()
+                    continue
+                if mask & selectors.EVENT_READ:
+                    self._read_requests()
+                if mask & selectors.EVENT_WRITE:
+                    self._set_write_blocked(False)
+            self._check_timeouts()
+            if not self.write_blocked:
+                self._schedule()
+            self._expire_sessions()
+
+    def _next_wakeup(self):
+        if self.outbox.queue and not self.write_blocked:
+            return 0
+        if self.active and not self.write_blocked:
+            if any(s.eof_pending or s.sender.can_send() for s in self.active):
+                return 0
+        timeouts = [s.sender.next_timeout() for s in self.active]
+        return min((t for t in timeouts if t is not None), default=SESSION_TIMEOUT)
+
+    def _set_write_blocked(self, blocked):
+        if blocked != self.write_blocked:
+            self.write_blocked = blocked
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if blocked else 0)
+            self.selector.modify(self.sock, events)
+
+    def _hash_later(self, cache, key, message, client_address):
+        """
+        Calcula o hash da versão `key` com o `cache` (DigestCache) de um algoritmo
+        e refaz o GET do cliente quando ele estiver pronto.
+        """
+        job = (cache.algorithm, key)
+        waiting = self.hashing.get(job)
+        if waiting is None:
+            waiting = self.hashing[job] = {}
+            future = self.hasher.submit(cache.compute, key)
+            future.add_done_callback(lambda future: self._hash_done(job, future))
+        waiting[client_address] = message  # GETs repetidos não somam trabalho
+
+    def _hash_done(self, job, future):
+        # Roda na thread do hash: só entrega o resultado e acorda o laço
+        self.hashed.append((job, future))
+        try:
+            self.wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # O laço já tem um aviso pendente
+
+    def _finish_hashes(self):
+        try:
+            while self.wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self.hashed:
+            job, future = self.hashed.popleft()
+            waiting = self.hashing.pop(job)
+            try:
+                future.result()  # O próprio DigestCache guardou o hash
+            except OSError as e:
+                logger.warning("Erro ao ler '%s': %s", job[1][0], e)
+                for client_address in waiting:
+                    self._send_control(b"ERROR: File not found", client_address)
+                continue
+            for client_address, message in waiting.items():
+                self._handle_request(message, client_address, replay=True)
+
+    def _send_control(self, data, client_address):
+        try:
+            self.sock.sendto(data, client_address)
+        except BlockingIOError:
+            # O cliente repete a requisição após o próprio timeout
+            logger.warning(
+                "Buffer de envio cheio; resposta a %s descartada.", client_address
+            )
+
+    def _read_requests(self):
+        read = 0
+        while read < READ_BATCH:
+            try:
+                if self.inbox is not None:
+                    datagrams = self.inbox.receive()
+                else:
+                    datagrams = [self.sock.recvfrom(BUFFER_SIZE)]
+            except BlockingIOError:
+                return
+            except ConnectionError:
+                read += 1
+                continue
+            for message, client_address in datagrams:
+                self._handle_request(bytes(message), client_address)
+            read += len(datagrams)
+
+    def _handle_request(self, message, client_address, replay=False):
+        session = self.sessions.get(client_address)
+        if session is not None:
+            session.last_activity = time.monotonic()
+
+        if message.startswith(b"GET"):
+            # "GET <arquivo> [WINDOW] [chave=valor ...]": sem WINDOW usa o envio
+            # legado. Opções: chunk propõe o tamanho de chunk, window limita os
+            # chunks em voo, fec pede uma paridade XOR a cada N chunks, missing
+            # (retomada) restringe o envio aos intervalos listados, check e digest
+            # listam, em ordem de preferência, o checksum por chunk e o hash do
+            # arquivo inteiro aceitos pelo cliente
+            parts = message.decode(errors="replace").split()
+            filename = parts[1] if len(parts) > 1 else ""
+            window_mode = "WINDOW" in parts[2:]
+            options = protocol.parse_options(parts[2:])
+            if not os.path.isfile(filename):
                 # Arquivo não encontrado
                 error_msg = "ERROR: File not found"
-                server_socket.sendto(error_msg.encode(), client_address)
-                print(
-                    f"Arquivo '{filename}' não encontrado. Mensagem de erro enviada ao cliente."
+                self._send_control(error_msg.encode(), client_address)
+                logger.info(
+                    "Arquivo '%s' não encontrado. Mensagem de erro enviada.", filename
                 )
-        elif request.startswith("RESEND"):
-            # Extrai os números dos chunks faltantes
-            parts = request.split()
-            if len(parts) > 1:
-                missing_chunks = parts[1:]
-                print(
-                    f"Cliente {client_address} solicitou retransmissão dos chunks: {missing_chunks}"
+                return
+
+            chunk_size = negotiate_chunk_size(options)
+            check = protocol.choose(
+                options.get("check"), protocol.CHECKSUMS, protocol.DEFAULT_CHECKSUM
+            )
+            digest = protocol.choose(
+                options.get("digest"), protocol.DIGESTS, protocol.DEFAULT_DIGEST
+            )
+            cache = digests[digest]
+            try:
+                if replay:
+                    # GET refeito depois do hash: a consulta já foi contada
+                    key = digest_cache.file_key(filename)
+                    file_hash = cache.peek(key)
+                else:
+                    key, file_hash = cache.lookup(filename)
+            except OSError as e:
+                self._send_control(b"ERROR: File not found", client_address)
+                logger.warning("Erro ao acessar '%s': %s", filename, e)
+                return
+            if file_hash is None:
+                self._hash_later(cache, key, message, client_address)
+                return
+            identity = file_identity(key, file_hash)
+            file_size = identity["size"]
+            total_chunks = file_size // chunk_size + (file_size % chunk_size > 0)
+            resume = "missing" in options
+            try:
+                chunks = requested_chunks(options, total_chunks)
+            except ValueError:
+                self._send_control(b"ERROR: Invalid request", client_address)
+                logger.warning(
+                    "Intervalos inválidos na retomada de %s.", client_address
                 )
+                return
+            # As paridades cobrem blocos contíguos, o que a retomada não garante
+            fec_block = 0 if resume else negotiate_fec(options)
+            # Confirmação com o número total de chunks, os parâmetros acordados e a
+            # identidade do arquivo (tamanho, mtime e hash), que o cliente compara
+            # com a do journal antes de aproveitar um download parcial
+            reply = "OK " + protocol.format_options(
+                {
+                    "total": total_chunks,
+                    "chunk": chunk_size,
+                    "fec": fec_block,
+                    "check": check,
+                    "digest": digest,
+                }
+                | identity
+            )
+            if (
+                session is not None
+                and session.sender is not None
+                and session.request == message
+            ):
+                # GET repetido: a confirmação anterior se perdeu
+                self._send_control(reply.encode(), client_address)
+                return
 
-                # Recupera o nome do arquivo associado ao cliente
-                filename = client_files.get(client_address, None)
-                if filename and os.path.isfile(filename):
-                    with open(filename, "rb") as f:
-                        for chunk_num_str in missing_chunks:
-                            chunk_num = int(chunk_num_str)
-                            f.seek(chunk_num * CHUNK_SIZE)
-                            chunk_data = f.read(CHUNK_SIZE)
-                            checksum = create_checksum(chunk_data)
-                            header = f"{chunk_num}|{checksum}|".encode()
-                            packet = header + chunk_data
-                            server_socket.sendto(packet, client_address)
-                            print(f"Reenviado chunk {chunk_num}")
-                    # Envia o pacote EOF após a retransmissão
-                    server_socket.sendto(b"EOF", client_address)
-                    print("Pacote EOF enviado após retransmissão.")
+            if session is not None:
+                self._remove(session)
+            file_key = (filename, file_size, identity["mtime"])
+            session = Session(client_address, file_key, chunk_size, total_chunks, check)
+            session.request = message
+            self.sessions[client_address] = session
+            fec = None
+            if fec_block:
+                fec = ParityEncoder(
+                    fec_block, chunk_size, total_chunks, protocol.CHECKSUMS[check]
+                )
+            try:
+                if window_mode:
+                    max_window = negotiate_window(options)
+                    session.start(
+                        lambda source: WindowSender(
+                            self.outbox,
+                            client_address,
+                            source,
+                            total_chunks,
+                            max_window,
+                            fec,
+                            chunks if resume else None,
+                        )
+                    )
                 else:
-                    error_msg = "ERROR: File not found"
-                    server_socket.sendto(error_msg.encode(), client_address)
-                    print(f"Arquivo '{filename}' não encontrado durante retransmissão.")
+                    session.start(
+                        lambda source: BlastSender(
+                            self.outbox, client_address, source, chunks, fec
+                        )
+                    )
+            except OSError as e:
+                # Arquivo sem permissão de leitura ou removido depois do stat
+                self._remove(session)
+                self._send_control(b"ERROR: File not found", client_address)
+                logger.warning("Erro ao abrir '%s': %s", filename, e)
+                return
+            # Os chunks só saem na próxima rodada do rodízio, depois do OK
+            self._send_control(reply.encode(), client_address)
+            logger.info(
+                "Cliente %s requisitou o arquivo '%s'. Total de chunks a enviar: "
+                "%d/%d de %d bytes",
+                client_address,
+                filename,
+                len(chunks),
+                total_chunks,
+                chunk_size,
+            )
+            self.active.append(session)
+
+        elif message.startswith(b"RESEND"):
+            # Relatório compacto dos chunks faltantes; uma rodada pode vir em vários
+            # datagramas, e o EOF só é enviado depois do último deles
+            try:
+                resend_round, last, missing = parse_resend(message)
+            except (struct.error, ValueError):
+                logger.warning(
+                    "Requisição de retransmissão inválida de %s.", client_address
+                )
+                return
+            if session is None or not os.path.isfile(session.filename):
+                error_msg = "ERROR: File not found"
+                self._send_control(error_msg.encode(), client_address)
+                logger.warning(
+                    "Sessão de %s não encontrada para retransmissão.", client_address
+                )
+                return
+            end = session.total_chunks
+            missing_chunks = [
+                chunk_num
+                for first, last_chunk in missing
+                for chunk_num in range(first, min(last_chunk + 1, end))
+            ]
+            logger.debug(
+                "Cliente %s solicitou retransmissão de %d chunks (rodada %d).",
+                client_address,
+                len(missing_chunks),
+                resend_round,
+            )
+            if (
+                isinstance(session.sender, BlastSender)
+                and session.resend_round == resend_round
+            ):
+                session.sender.queue.extend(missing_chunks)
             else:
-                print(f"Requisição de retransmissão inválida de {client_address}.")
+                session.resend_round = resend_round
+                try:
+                    session.start(
+                        lambda source: BlastSender(
+                            self.outbox, client_address, source, missing_chunks
+                        )
+                    )
+                except OSError as e:
+                    self._remove(session)
+                    self._send_control(b"ERROR: File not found", client_address)
+                    logger.warning("Erro ao abrir '%s': %s", session.filename, e)
+                    return
+                if session not in self.active:
+                    self.active.append(session)
+            session.sender.retransmissions += len(missing_chunks)
+            session.sender.awaiting_more = not last
+
+        elif message.startswith(b"ACK"):
+            if session is None or not isinstance(session.sender, WindowSender):
+                return  # ACK atrasado de uma transferência já concluída
+            try:
+                cumulative, ranges = parse_ack(message)
+            except (struct.error, ValueError):
+                logger.warning("ACK inválido de %s: %r", client_address, message)
+                return
+            session.sender.on_ack(cumulative, ranges)
+
+        elif message.startswith(b"STATS"):
+            # Estatísticas do servidor, para ferramentas de medição
+            stats = packet_cache.stats() | {"sessions": len(self.sessions)}
+            for name in ("entries", "hits", "misses"):
+                stats[f"digest_{name}"] = sum(
+                    cache.stats()[name] for cache in digests.values()
+                )
+            reply = "STATS " + protocol.format_options(stats)
+            self._send_control(reply.encode(), client_address)
+
         else:
             # Requisição inválida
             error_msg = "ERROR: Invalid request"
-            server_socket.sendto(error_msg.encode(), client_address)
-            print(
-                f"Recebida requisição inválida de {client_address}. Mensagem de erro enviada."
+            self._send_control(error_msg.encode(), client_address)
+            logger.warning(
+                "Recebida requisição inválida de %s. Mensagem de erro enviada.",
+                client_address,
+            )
+
+    def _check_timeouts(self):
+        for session in list(self.active):
+            timeout = session.sender.next_timeout()
+            if timeout is None or timeout > 0:
+                continue
+            if session.sender.on_timeout() > MAX_TIMEOUTS:
+                logger.warning(
+                    "Cliente %s não responde. Envio abortado.", session.client_address
+                )
+                session.eof_pending = True
+
+    def _schedule(self):
+        """
+        Uma rodada do rodízio: cada sessão ativa enfileira até QUANTUM chunks, e a
+        rodada inteira é entregue ao socket de uma vez. Se o buffer de envio do
+        socket encher, novas rodadas esperam até ele liberar.
+        """
+        if not self._flush():
+            return
+        for _ in range(len(self.active)):
+            session = self.active[0]
+            self.active.rotate(-1)
+            if session.eof_pending:
+                self._finish(session)
+                continue
+            session.sender.pump(QUANTUM)
+            if session.sender.done():
+                self._finish(session)
+        self._flush()
+
+    def _flush(self):
+        try:
+            self.outbox.flush()
+        except BlockingIOError:
+            self._set_write_blocked(True)
+            return False
+        return True
+
+    def _finish(self, session):
+        """Envia o EOF e tira a sessão do rodízio (ela fica na tabela para RESEND)."""
+        # O EOF vai pela mesma fila, depois dos últimos chunks da sessão
+        self.outbox.sendto(
+            protocol.build_eof(session.resend_round), session.client_address
+        )
+        sender = session.sender
+        elapsed = max(time.monotonic() - session.started_at, 1e-9)
+        logger.info(
+            "Envio de '%s' para %s concluído em %.2fs: %d pacotes (%.0f pacotes/s), "
+            "%d retransmissões (cache de pacotes: %s de acertos).",
+            session.filename,
+            session.client_address,
+            elapsed,
+            sender.packets_sent,
+            sender.packets_sent / elapsed,
+            sender.retransmissions,
+            packet_cache.stats()["hit_rate"],
+        )
+        self.active.remove(session)
+        session.close()
+        session.eof_pending = False
+        session.last_activity = time.monotonic()
+
+    def _remove(self, session):
+        if session in self.active:
+            self.active.remove(session)
+        session.close()
+        del self.sessions[session.client_address]
+
+    def _expire_sessions(self):
+        now = time.monotonic()
+        if now - self.last_sweep < 1:
+            return
+        self.last_sweep = now
+        for session in list(self.sessions.values()):
+            sender = session.sender
+            idle = sender is None or (
+                not sender.can_send() and sender.next_timeout() is None
             )
+            if idle and now - session.last_activity > SESSION_TIMEOUT:
+                self._remove(session)
+
+
+def serve(server_socket):
+    Server(server_socket).serve_forever()
+
+
+def main():
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.bind((SERVER_IP, SERVER_PORT))
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(message)s")
+    logger.info("Servidor ouvindo na porta %d", SERVER_PORT)
+    serve(server_socket)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import time
+
+import client
+import protocol
+import server
+
+BENCH_PORT = 12399  # Porta do servidor de teste (loopback)
+BLOCK = 1024 * 1024  # Bloco aleatório repetido para gerar os arquivos de teste
+
+
+def run_server(port):
+    sys.stdout = open(os.devnull, "w")  # Sem o log de conexões do servidor
+    asyncio.run(server.serve("127.0.0.1", port))
+
+
+def start_server(port):
+    """Sobe o servidor em outro processo, para não disputar o GIL com o cliente."""
+    process = multiprocessing.Process(target=run_server, args=(port,), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return process
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    raise RuntimeError("servidor de teste não subiu")
+
+
+def create_file(filename, size):
+    if os.path.isfile(filename) and os.path.getsize(filename) == size:
+        return
+    block = os.urandom(BLOCK)
+    with open(filename, "wb") as f:
+        for offset in range(0, size, BLOCK):
+            f.write(block[: size - offset])
+
+
+class LegacyDownload(client.Download):
+    """Recepção original, para comparação: acumula tudo e grava/hasheia no fim."""
+
+    def __init__(self, fields, output_name, show_progress=False):
+        super().__init__(fields, output_name, show_progress)
+        self.file_data = b""
+
+    def write(self, chunk):
+        # Em blocos de 4 KB, como o recv(4096) original
+        for offset in range(0, len(chunk), 4096):
+            self.file_data += chunk[offset : offset + 4096]
+        self.received_bytes = len(self.file_data)
+
+    def finish(self, trailer):
+        self.output.write(self.file_data)
+        self.sha256_hash = hashlib.sha256(self.file_data)
+        return super().finish(trailer)
+
+
+def measure(port, filename, legacy=False):
+    """
+    Baixa `filename`. Retorna (segundos, CPU do cliente em segundos, pico de
+    memória do processo em MB, hash confere).
+    """
+    if legacy:
+        client.Download = LegacyDownload  # Cada medição roda em um processo novo
+    sock = socket.create_connection(("127.0.0.1", port))
+    receiver = client.Receiver(sock, f"recv_bench_{os.getpid()}_", False)
+    output_name = None
+    ok = False
+    try:
+        start = time.monotonic()
+        cpu_start = time.process_time()
+        client.send_command(sock, f"Arquivo {filename}")
+        while True:
+            frame = receiver.receive()
+            if frame is None:
+                break
+            frame_type, _, result = frame
+            if frame_type == protocol.FILE_HEADER and result is not None:
+                output_name = result.output.name
+            elif frame_type == protocol.FILE_END:
+                ok = result is not None and result[1]
+                break
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+    finally:
+        receiver.close()
+        sock.close()
+        if output_name is not None and os.path.exists(output_name):
+            os.remove(output_name)
+    # ru_maxrss: kB no Linux, bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, cpu, peak, ok
+
+
+def parallel_rate(port, filename, size, connections, runs):
+    """
+    Baixa `filename` em faixas por `connections` conexões, contra uma conexão
+    só. No loopback não há latência: o ganho real aparece em enlaces longos.
+    """
+    prefix = f"recv_bench_{os.getpid()}_"
+    for count in sorted({1, connections}):
+        for run in range(1, runs + 1):
+            start = time.monotonic()
+            _, ok = client.fetch_parallel(("127.0.0.1", port), filename, count, prefix)
+            elapsed = time.monotonic() - start
+            print(
+                f"{size:>5} MB {count:>2} conexões #{run}: {elapsed:6.2f}s, "
+                f"{size / elapsed:7.1f} MB/s, hash {'ok' if ok else 'FALHOU'}"
+            )
+    os.remove(prefix + os.path.basename(filename))
+
+
+def run_measure(args):
+    """Medição em um processo novo, para que o pico de memória seja só dela."""
+    return measure(*args)
+
+
+async def count_messages(port, connections, expected, ready, go, timeout):
+    """
+    Abre `connections` conexões e conta os frames de chat recebidos em todas até
+    chegar a `expected` ou passar `timeout` segundos sem nenhum. Retorna
+    (mensagens recebidas, instante da última).
+    """
+    streams = [
+        await asyncio.open_connection("127.0.0.1", port) for _ in range(connections)
+    ]
+    ready.wait()  # Barreira entre os processos: todas as conexões abertas
+    go.wait()
+    received = 0
+    last = time.monotonic()
+
+    async def reader(stream_reader):
+        # Lê em blocos grandes e percorre os cabeçalhos, para que o leitor custe
+        # pouco perto do servidor medido
+        nonlocal received, last
+        buffer = b""
+        while received < expected:
+            data = await stream_reader.read(65536)
+            if not data:
+                return
+            buffer += data
+            offset = 0
+            while len(buffer) - offset >= protocol.HEADER_SIZE:
+                frame_type, _, length = protocol.HEADER.unpack_from(buffer, offset)
+                end = offset + protocol.HEADER_SIZE + length
+                if end > len(buffer):
+                    break
+                if frame_type == protocol.CHAT:
+                    received += 1
+                offset = end
+            buffer = buffer[offset:]
+            last = time.monotonic()
+
+    tasks = [asyncio.create_task(reader(r)) for r, _ in streams]
+    while received < expected and time.monotonic() - last < timeout:
+        await asyncio.sleep(0.05)
+    for task in tasks:
+        task.cancel()
+    for _, writer in streams:
+        writer.close()
+    return received, last
+
+
+def run_receivers(args):
+    port, connections, expected, ready, go, timeout = args
+    server.raise_fd_limit()
+    return asyncio.run(count_messages(port, connections, expected, ready, go, timeout))
+
+
+def process_cpu(pid):
+    """CPU (usuário + sistema, em segundos) do processo `pid`; None fora do Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def broadcast_rate(port, server_pid, clients, messages, size, processes, timeout=5):
+    """
+    Mensagens entregues por segundo: `clients` clientes conectados (divididos
+    entre `processes` processos leitores) e um cliente extra que envia
+    `messages` mensagens de chat de `size` bytes o mais rápido possível. Cada
+    mensagem deve chegar aos `clients` clientes. Com leitores e servidor na
+    mesma máquina, as entregas por segundo de CPU do servidor isolam o custo dele.
+    """
+    manager = multiprocessing.Manager()
+    ready = manager.Barrier(processes + 1)
+    go = manager.Event()
+    shares = [
+        clients // processes + (i < clients % processes) for i in range(processes)
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map_async(
+            run_receivers,
+            [(port, share, share * messages, ready, go, timeout) for share in shares],
+        )
+        ready.wait()
+        sender = socket.create_connection(("127.0.0.1", port))
+        frame = protocol.pack(protocol.CHAT, b"x" * size)
+        cpu_start = process_cpu(server_pid)
+        start = time.monotonic()
+        go.set()
+        for _ in range(messages):
+            sender.sendall(frame)
+        counts = results.get()
+        cpu = process_cpu(server_pid)
+        sender.close()
+    delivered = sum(received for received, _ in counts)
+    elapsed = max(last for _, last in counts) - start
+    expected = clients * messages
+    print(
+        f"{clients} clientes, {messages} mensagens de {size} bytes: "
+        f"{delivered}/{expected} entregues ({1 - delivered / expected:.1%} "
+        f"descartadas) em {elapsed:.2f}s, {delivered / elapsed:,.0f} entregas/s"
+    )
+    if cpu is not None:
+        cpu -= cpu_start
+        print(
+            f"CPU do servidor: {cpu:.2f}s, "
+            f"{delivered / max(cpu, 1e-3):,.0f} entregas por segundo de CPU"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede a recepção de arquivos grandes pelo cliente (loopback)."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1024],
+        help="tamanhos dos arquivos de teste em MB",
+    )
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument(
+        "--legacy",
+        type=int,
+        default=0,
+        metavar="MB",
+        help="também mede a recepção original para arquivos de até MB megabytes "
+        "(quadrática: use só tamanhos pequenos)",
+    )
+    parser.add_argument("--keep", action="store_true", help="não apaga os arquivos")
+    parser.add_argument(
+        "--broadcast",
+        type=int,
+        metavar="CLIENTES",
+        help="mede só as entregas de chat por segundo para CLIENTES conectados",
+    )
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--message-size", type=int, default=100)
+    parser.add_argument(
+        "--processes", type=int, default=4, help="processos leitores no broadcast"
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="CONEXÕES",
+        help="mede só o download em faixas por CONEXÕES conexões contra uma",
+    )
+    args = parser.parse_args()
+
+    process = start_server(BENCH_PORT)
+    if args.broadcast:
+        broadcast_rate(
+            BENCH_PORT,
+            process.pid,
+            args.broadcast,
+            args.messages,
+            args.message_size,
+            args.processes,
+        )
+        process.terminate()
+        return
+    if args.parallel:
+        for size in args.sizes:
+            filename = f"bench_{size}MB.bin"
+            create_file(filename, size * 1024 * 1024)
+            parallel_rate(BENCH_PORT, filename, size, args.parallel, args.runs)
+            if not args.keep:
+                os.remove(filename)
+        process.terminate()
+        return
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for size in args.sizes:
+            filename = f"bench_{size}MB.bin"
+            create_file(filename, size * 1024 * 1024)
+            variants = [False] + ([True] if size <= args.legacy else [])
+            for legacy in variants:
+                label = "original" if legacy else "streaming"
+                for run in range(1, args.runs + 1):
+                    elapsed, cpu, peak, ok = pool.apply(
+                        run_measure, ((BENCH_PORT, filename, legacy),)
+                    )
+                    print(
+                        f"{size:>5} MB {label:>9} #{run}: {elapsed:6.2f}s, "
+                        f"{size / elapsed:7.1f} MB/s, CPU {cpu:6.2f}s "
+                        f"({cpu / size * 1000:5.2f} ms/MB), pico {peak:7.1f} MB, "
+                        f"hash {'ok' if ok else 'FALHOU'}"
+                    )
+            if not args.keep:
+                os.remove(filename)
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
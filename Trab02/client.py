@@ -1,92 +1,325 @@
 #!/usr/bin/env python3
+import hashlib
+import os
 import socket
 import threading
-import hashlib
+import time
+
+import protocol
+
+# Configuração do cliente
+RECV_BUFFER_SIZE = 256 * 1024  # Buffer reutilizado na recepção de arquivos
+PROGRESS_STEP = 1024 * 1024  # Intervalo (em bytes) das mensagens de progresso
+PARALLEL_CONNECTIONS = 4  # Conexões (uma faixa cada) em "Paralelo" por padrão
+
+
+class Download:
+    """
+    Arquivo sendo recebido em um stream: cada frame de dados vai direto para o
+    arquivo de saída e para o SHA-256, com memória constante. Uma faixa (header
+    com INICIO) é gravada na sua posição, sem apagar o resto do arquivo.
+    """
+
+    def __init__(self, fields, output_name, show_progress=True):
+        self.filename = fields.get("NOME", "arquivo_recebido")
+        self.filesize = int(fields.get("TAMANHO", "0"))
+        self.file_hash = fields.get("HASH", "")
+        self.first = int(fields["INICIO"]) if "INICIO" in fields else None
+        self.total = int(fields.get("TOTAL", self.filesize))
+        if self.first is None:
+            self.output = open(output_name, "wb")
+        else:
+            self.output = open(
+                output_name, "r+b" if os.path.exists(output_name) else "wb"
+            )
+            self.output.seek(self.first)
+        self.sha256_hash = hashlib.sha256()
+        self.received_bytes = 0
+        self.last_printed = 0
+        self.show_progress = show_progress
+
+    def write(self, chunk):
+        self.output.write(chunk)
+        self.sha256_hash.update(chunk)
+        self.received_bytes += len(chunk)
+        # Imprime a cada 1MB recebido ou quando o arquivo estiver completo
+        if self.show_progress and (
+            self.received_bytes - self.last_printed >= PROGRESS_STEP
+            or self.received_bytes == self.filesize
+        ):
+            print(
+                f"Recebendo arquivo '{self.filename}': "
+                f"{self.received_bytes}/{self.filesize} bytes recebidos."
+            )
+            self.last_printed = self.received_bytes
+
+    def finish(self, trailer):
+        """
+        Fecha o arquivo. `trailer` é o payload do FILE_END (o hash, se ele não veio
+        no header). Retorna True se o arquivo está completo e íntegro; de uma
+        faixa, só se confere o tamanho (o hash é o do arquivo inteiro).
+        """
+        self.output.close()
+        if trailer:
+            self.file_hash = trailer.decode(errors="replace")
+        if self.first is not None:
+            return self.received_bytes == self.filesize
+        return (
+            self.received_bytes == self.filesize
+            and self.sha256_hash.hexdigest() == self.file_hash
+        )
+
+    def close(self):
+        self.output.close()
+
+
+class Receiver:
+    """
+    Lê os frames que o servidor envia. Os arquivos de cada stream são gravados
+    como `prefix` + nome à medida que os frames de dados chegam, intercalados
+    com as mensagens de chat.
+    """
+
+    def __init__(self, sock, prefix="recv_", show_progress=True):
+        self.stream = sock.makefile("rb", buffering=RECV_BUFFER_SIZE)
+        self.buffer = bytearray(RECV_BUFFER_SIZE)
+        self.prefix = prefix
+        self.show_progress = show_progress
+        self.downloads = {}  # stream -> Download
+
+    def receive(self):
+        """
+        Lê e trata o próximo frame. Retorna (tipo, stream, resultado) ou None se
+        a conexão foi encerrada. O resultado é o texto (CHAT e CONTROL), o
+        Download iniciado ou None se o arquivo não existe (FILE_HEADER), ou
+        (Download, íntegro) no FILE_END.
+        """
+        header = protocol.read_frame_header(self.stream)
+        if header is None:
+            return None
+        frame_type, stream, length = header
+
+        if frame_type == protocol.FILE_DATA:
+            # Direto no buffer reutilizado, sem criar um objeto por frame
+            if length > len(self.buffer):
+                self.buffer = bytearray(length)
+            view = memoryview(self.buffer)[:length]
+            if self.stream.readinto(view) < length:
+                return None
+            download = self.downloads.get(stream)
+            if download is not None:
+                download.write(view)
+            return frame_type, stream, None
+
+        payload = self.stream.read(length)
+        if len(payload) < length:
+            return None
+        if frame_type == protocol.FILE_HEADER:
+            fields = protocol.parse_fields(payload)
+            if fields.get("STATUS") != "OK":
+                return frame_type, stream, None
+            output_name = self.prefix + os.path.basename(fields.get("NOME", ""))
+            download = Download(fields, output_name, self.show_progress)
+            self.downloads[stream] = download
+            return frame_type, stream, download
+        if frame_type == protocol.FILE_END:
+            download = self.downloads.pop(stream, None)
+            if download is None:
+                return frame_type, stream, None
+            return frame_type, stream, (download, download.finish(payload))
+        return frame_type, stream, payload.decode(errors="replace")
+
+    def close(self):
+        for download in self.downloads.values():
+            download.close()
+        self.downloads.clear()
+        self.stream.close()
 
 
 def receive_messages(sock):
     """
     Thread que recebe mensagens do servidor.
-    Se detectar um header de arquivo (iniciando com "NOME:"), trata a transferência do arquivo.
-    Durante o recebimento, exibe o progresso da transferência.
+    Transferências de arquivo chegam em frames próprios e são gravadas enquanto
+    o chat continua; durante o recebimento, exibe o progresso da transferência.
     """
-    while True:
-        try:
-            data = sock.recv(4096)
-            if not data:
+    receiver = Receiver(sock)
+    try:
+        while True:
+            frame = receiver.receive()
+            if frame is None:
                 print("Conexão encerrada pelo servidor.")
                 break
 
-            text = data.decode(errors="ignore")
-            if text.startswith("NOME:"):
-                # Lê o header completo até encontrar "HEADER_END"
-                header_data = text
-                while "HEADER_END" not in header_data:
-                    more = sock.recv(4096).decode(errors="ignore")
-                    header_data += more
-
-                lines = header_data.splitlines()
-                header_fields = {}
-                for line in lines:
-                    if line == "HEADER_END":
-                        break
-                    if ":" in line:
-                        key, value = line.split(":", 1)
-                        header_fields[key] = value
-
-                filename = header_fields.get("NOME", "arquivo_recebido")
-                filesize = int(header_fields.get("TAMANHO", "0"))
-                file_hash = header_fields.get("HASH", "")
-                status = header_fields.get("STATUS", "NOK")
-
-                if status != "OK":
-                    print(f"Erro: Arquivo '{filename}' não encontrado no servidor.")
-                    continue
-
-                print(
-                    f"Iniciando recebimento do arquivo '{filename}' com tamanho {filesize} bytes."
-                )
-                received_bytes = 0
-                file_data = b""
-                last_printed = 0
-
-                while received_bytes < filesize:
-                    chunk = sock.recv(min(4096, filesize - received_bytes))
-                    if not chunk:
-                        break
-                    file_data += chunk
-                    received_bytes += len(chunk)
-                    # Imprime a cada 1MB recebido ou quando o arquivo estiver completo
-                    if (received_bytes - last_printed >= 1024 * 1024) or (
-                        received_bytes == filesize
-                    ):
-                        print(
-                            f"Recebendo arquivo '{filename}': {received_bytes}/{filesize} bytes recebidos."
-                        )
-                        last_printed = received_bytes
-
-                # Salva o arquivo recebido
-                with open("recv_" + filename, "wb") as f:
-                    f.write(file_data)
-
-                # Verifica a integridade do arquivo recebido (SHA-256)
-                sha256_hash = hashlib.sha256()
-                sha256_hash.update(file_data)
-                received_hash = sha256_hash.hexdigest()
-
-                if received_hash == file_hash:
+            frame_type, stream, result = frame
+            if frame_type == protocol.FILE_HEADER:
+                if result is None:
+                    print("Erro: Arquivo não encontrado ou faixa inválida.")
+                else:
+                    print(
+                        f"Iniciando recebimento do arquivo '{result.filename}' "
+                        f"com tamanho {result.filesize} bytes."
+                    )
+            elif frame_type == protocol.FILE_END and result is not None:
+                download, ok = result
+                if download.first is not None:
+                    last = download.first + download.filesize - 1
+                    status = "recebida" if ok else "incompleta"
                     print(
-                        f"Arquivo '{filename}' recebido com sucesso e integridade verificada."
+                        f"Faixa {download.first}-{last} do arquivo "
+                        f"'{download.filename}' {status}."
+                    )
+                elif ok:
+                    print(
+                        f"Arquivo '{download.filename}' recebido com sucesso e "
+                        "integridade verificada."
                     )
                 else:
-                    print(f"Arquivo '{filename}' recebido, mas a integridade falhou.")
-            else:
-                # Mensagens que não sejam transferência de arquivo (chat ou notificações)
-                print(text)
+                    print(
+                        f"Arquivo '{download.filename}' recebido, mas a "
+                        "integridade falhou."
+                    )
+            elif frame_type in (protocol.CHAT, protocol.CONTROL):
+                # Mensagens que não sejam transferência de arquivo (chat ou avisos)
+                print(result)
+
+    except Exception as e:
+        print(f"Erro ao receber dados: {e}")
+    finally:
+        receiver.close()
+
+
+def send_command(sock, command):
+    """
+    Comandos ("Arquivo <nome>", "Faixa <início>-<fim> <nome>", "Estatisticas",
+    "Sair") vão como CONTROL; "Arquivos <nome> <nome> ..." vira um único CONTROL
+    com um pedido por linha, que o servidor atende em paralelo. O comando é
+    reconhecido pela primeira palavra; o resto é chat. "Chat <mensagem>" envia a
+    mensagem como chat mesmo que ela comece com o nome de um comando.
+    """
+    text = command.strip()
+    name = text.split(maxsplit=1)[0] if text else ""
+    if name == "Chat":
+        sock.sendall(protocol.pack_text(protocol.CHAT, text[len(name) :].strip()))
+    elif name == "Arquivos":
+        lines = [f"Arquivo {filename}" for filename in text.split()[1:]]
+        sock.sendall(protocol.pack_text(protocol.CONTROL, "\n".join(lines)))
+    elif text in ("Sair", "Estatisticas") or name in ("Arquivo", "Faixa"):
+        sock.sendall(protocol.pack_text(protocol.CONTROL, text))
+    else:
+        sock.sendall(protocol.pack_text(protocol.CHAT, command))
+
+
+def wait_download(receiver):
+    """
+    Lê frames até o fim do próximo arquivo pedido nesta conexão, ignorando o
+    chat. Retorna (Download, íntegro), ou None se o servidor recusou o pedido ou
+    a conexão caiu.
+    """
+    while True:
+        frame = receiver.receive()
+        if frame is None:
+            return None
+        frame_type, _, result = frame
+        if frame_type == protocol.FILE_HEADER and result is None:
+            return None
+        if frame_type == protocol.FILE_END and result is not None:
+            return result
+
+
+def fetch_range(sock, receiver, filename, first, last):
+    command = f"Faixa {first}-{last} {filename}"
+    sock.sendall(protocol.pack_text(protocol.CONTROL, command))
+    return wait_download(receiver)
 
-        except Exception as e:
-            print(f"Erro ao receber dados: {e}")
-            break
+
+def fetch_parallel(address, filename, connections=PARALLEL_CONNECTIONS, prefix="recv_"):
+    """
+    Baixa `filename` em `connections` faixas, cada uma pela sua conexão TCP,
+    gravando cada faixa direto na posição final do arquivo de saída; no fim,
+    confere o SHA-256 do arquivo inteiro. Em enlaces com muita latência, uma
+    única conexão não ocupa a banda disponível. Retorna (bytes, íntegro) ou None
+    se o servidor recusou o pedido.
+    """
+    socks = [socket.create_connection(address)]
+    receivers = [Receiver(socks[0], prefix, False)]
+    try:
+        # Faixa de um byte só para saber o tamanho e o hash do arquivo
+        probe = fetch_range(socks[0], receivers[0], filename, 0, 0)
+        if probe is None:
+            # Arquivo vazio não tem faixa válida: pede o arquivo inteiro
+            send_command(socks[0], f"Arquivo {filename}")
+            result = wait_download(receivers[0])
+            return None if result is None else (result[0].filesize, result[1])
+        download, _ = probe
+        total = download.total
+        with open(download.output.name, "r+b") as output:
+            output.truncate(total)  # Pré-aloca: as faixas são gravadas no lugar
+
+        part = -(-total // connections)
+        ranges = [
+            (first, min(first + part, total) - 1) for first in range(0, total, part)
+        ]
+        for _ in ranges[1:]:
+            socks.append(socket.create_connection(address))
+            receivers.append(Receiver(socks[-1], prefix, False))
+        results = [None] * len(ranges)
+
+        def worker(index):
+            first, last = ranges[index]
+            results[index] = fetch_range(
+                socks[index], receivers[index], filename, first, last
+            )
+
+        threads = [
+            threading.Thread(target=worker, args=(i,)) for i in range(len(ranges))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ok = all(result is not None and result[1] for result in results)
+        if ok:
+            sha256_hash = hashlib.sha256()
+            with open(download.output.name, "rb") as f:
+                for block in iter(lambda: f.read(RECV_BUFFER_SIZE), b""):
+                    sha256_hash.update(block)
+            ok = sha256_hash.hexdigest() == download.file_hash
+        return total, ok
+    finally:
+        for receiver in receivers:
+            receiver.close()
+        for sock in socks:
+            sock.close()
+
+
+def start_parallel(address, command):
+    """Atende "Paralelo <n> <nome>" em outra thread, com conexões próprias."""
+    parts = command.split(maxsplit=2)
+    if len(parts) < 3 or not parts[1].isdigit() or int(parts[1]) < 1:
+        print("Uso: Paralelo <conexões> <nome>")
+        return
+    connections, filename = int(parts[1]), parts[2]
+
+    def worker():
+        start = time.monotonic()
+        try:
+            result = fetch_parallel(address, filename, connections)
+        except OSError as e:
+            print(f"Erro no download paralelo: {e}")
+            return
+        if result is None:
+            print(f"Erro: Arquivo '{filename}' não encontrado no servidor.")
+            return
+        size, ok = result
+        elapsed = time.monotonic() - start
+        status = "integridade verificada" if ok else "integridade falhou"
+        print(
+            f"Arquivo '{filename}' recebido em {connections} conexões "
+            f"({size} bytes em {elapsed:.2f}s, {status})."
+        )
+
+    threading.Thread(target=worker, daemon=True).start()
 
 
 def main():
@@ -104,12 +337,19 @@ def main():
     while True:
         try:
             command = input(
-                "Digite o comando (Arquivo <nome> ou Sair) ou uma mensagem para chat: "
+                "Digite o comando (Arquivo <nome>, Arquivos <nomes>, "
+                "Faixa <início>-<fim> <nome>, Paralelo <n> <nome>, Estatisticas "
+                "ou Sair) "
+                "ou uma mensagem para chat (Chat <mensagem> força o chat): "
             )
             if command.strip() == "":
                 continue
 
-            sock.sendall(command.encode())
+            if command.startswith("Paralelo "):
+                start_parallel((server_host, server_port), command)
+                continue
+
+            send_command(sock, command)
 
             if command.strip() == "Sair":
                 print("Encerrando conexão.")
@@ -0,0 +1,54 @@
+import struct
+
+# Formato das mensagens entre cliente e servidor, nos dois sentidos: cada uma vai
+# em um frame com cabeçalho binário fixo (7 bytes, ordem de rede):
+#   tipo (1 byte) | stream (2 bytes) | tamanho do payload (4 bytes)
+# O stream identifica a transferência de arquivo a que o frame pertence (0 nas
+# mensagens avulsas). Como os dados de um arquivo vão em vários frames, o
+# servidor intercala mensagens de chat (e outros arquivos) entre eles.
+HEADER = struct.Struct("!BHI")
+HEADER_SIZE = HEADER.size
+
+CHAT = 1  # Texto UTF-8 do chat
+CONTROL = 2  # Comando do cliente ("Arquivo <nome>", "Sair") ou aviso do servidor
+FILE_HEADER = 3  # Campos "CHAVE:valor" por linha (NOME, TAMANHO, HASH, STATUS...)
+FILE_DATA = 4  # Bytes do arquivo, em ordem
+FILE_END = 5  # Fim do arquivo; o payload traz o hash se ele não veio no header
+
+MAX_MESSAGE = 64 * 1024  # Maior payload aceito em frames que não são de dados
+MAX_STREAM = 0xFFFF
+
+
+def pack(frame_type, payload=b"", stream=0):
+    """Frame completo (cabeçalho + payload), para mensagens pequenas."""
+    return HEADER.pack(frame_type, stream, len(payload)) + payload
+
+
+def pack_text(frame_type, text, stream=0):
+    return pack(frame_type, text.encode(), stream)
+
+
+def format_fields(fields):
+    """Campos do FILE_HEADER no formato "CHAVE:valor", um por linha."""
+    return "".join(f"{key}:{value}\n" for key, value in fields.items()).encode()
+
+
+def parse_fields(payload):
+    fields = {}
+    for line in bytes(payload).decode(errors="replace").splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            fields[key] = value
+    return fields
+
+
+def read_frame_header(stream):
+    """
+    Lê o cabeçalho do próximo frame de `stream` (arquivo binário bufferizado,
+    como socket.makefile("rb")). Retorna (tipo, stream, tamanho) ou None no fim
+    da conexão.
+    """
+    data = stream.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        return None
+    return HEADER.unpack(data)
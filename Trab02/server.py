@@ -1,126 +1,483 @@
 #!/usr/bin/env python3
+import asyncio
+import os
 import socket
 import threading
-import os
-import hashlib
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows: o limite de descritores não é ajustável daqui
+    resource = None
+
+import digest_cache
+import metrics
+import protocol
+
+# Configuração do servidor
+HOST = "0.0.0.0"
+PORT = 12345  # Porta escolhida (maior que 1024)
+BACKLOG = 4096  # Conexões esperando accept (o kernel ainda limita por somaxconn)
+REUSE_ADDRESS = True  # SO_REUSEADDR: reinicia sem esperar o TIME_WAIT da porta
+TCP_NODELAY = True  # Sem o algoritmo de Nagle: mensagens de chat saem na hora
+# SO_SNDBUF / SO_RCVBUF das conexões, em bytes. None deixa o ajuste automático do
+# sistema; um valor fixo o desliga (no Linux) e limita a janela TCP
+SEND_BUFFER_BYTES = None
+RECV_BUFFER_BYTES = None
+FILE_FRAME = 256 * 1024  # Bytes de arquivo por frame FILE_DATA
+USE_SENDFILE = True  # Envia arquivos com os.sendfile quando o sistema permite
+OUTBOX_SIZE = 256  # Mensagens pendentes por cliente antes de aplicar a política
+WRITE_BUFFER_HIGH = 256 * 1024  # Bytes no buffer do transporte antes de esperar
+# Política para clientes lentos (fila cheia): "drop" descarta as mensagens de chat
+# que não couberem; "disconnect" encerra a conexão do cliente
+SLOW_CLIENT_POLICY = "drop"
+
+# Hash do arquivo ainda fora do cache: False calcula antes de enviar o header;
+# True começa o envio já e manda o hash no FILE_END
+HASH_TRAILER = False
 
-# Lista global de clientes e lock para acesso seguro
-clients = []
-clients_lock = threading.Lock()
+METRICS_INTERVAL = 0  # Segundos entre resumos de métricas no console (0: nunca)
 
+# Clientes conectados: tupla imutável substituída a cada conexão e desconexão
+# (cópia na escrita). O broadcast percorre a tupla do momento sem copiá-la, e
+# ninguém precisa de lock: todo o acesso acontece na thread do event loop
+clients = ()
+# Hashes dos arquivos servidos, por versão do arquivo
+digests = digest_cache.DigestCache()
+# Métricas das conexões, também enviadas a quem pedir "Estatisticas"
+stats = metrics.Metrics()
 
-def broadcast_message(message, exclude_conn=None):
+
+class FileStream:
     """
-    Envia uma mensagem para todos os clientes conectados, exceto o que estiver em exclude_conn.
+    Arquivo sendo enviado em um stream da conexão, um frame FILE_DATA de até
+    FILE_FRAME bytes por vez, para que outras mensagens possam passar entre eles.
+    Envia `filesize` bytes a partir de `first` (uma faixa, ou o arquivo todo).
+    Com `trailer_key` (versão do arquivo sem hash no cache), o hash é calculado
+    sobre os próprios bytes enviados e vai no FILE_END.
     """
-    with clients_lock:
-        for client in clients:
-            conn, addr = client
-            if conn != exclude_conn:
-                try:
-                    conn.sendall(message.encode())
-                except Exception as e:
-                    print(f"Erro ao enviar para {addr}: {e}")
-
-
-def handle_client(conn, addr):
-    """Trata a conexão de cada cliente em uma thread separada."""
-    print(f"Cliente conectado: {addr}")
-    while True:
-        try:
-            data = conn.recv(4096)
-            if not data:
-                print(f"Conexão encerrada pelo cliente {addr}")
-                break
 
-            command = data.decode().strip()
+    def __init__(self, stream, filename, filesize, trailer_key=None, first=0):
+        self.requested = time.monotonic()
+        self.stream = stream
+        self.filename = filename
+        self.filesize = filesize
+        self.trailer_key = trailer_key
+        self.file_hash = digests.new_hash() if trailer_key is not None else None
+        self.use_sendfile = USE_SENDFILE and trailer_key is None
+        self.file = None
+        self.offset = first
+        self.end = first + filesize
+        self.start = None
 
-            if command == "Sair":
-                print(f"Cliente {addr} pediu para sair.")
-                break
+    async def send_frame(self, writer):
+        """Envia o próximo frame do arquivo. Retorna True depois do FILE_END."""
+        if self.file is None:
+            self.file = open(self.filename, "rb")
+            self.start = time.monotonic()
+        length = min(FILE_FRAME, self.end - self.offset)
+        if not length:
+            digest = b""
+            if self.file_hash is not None:
+                digest = self.file_hash.hexdigest().encode()
+                digests.store(self.trailer_key, digest.decode())
+            writer.write(protocol.pack(protocol.FILE_END, digest, self.stream))
+            stats.sent(protocol.HEADER_SIZE + len(digest))
+            await writer.drain()
+            self.close()
+            return True
 
-            elif command.startswith("Arquivo"):
-                parts = command.split(maxsplit=1)
-                if len(parts) != 2:
-                    conn.sendall(
-                        "Formato de comando incorreto. Use: Arquivo <nome>\n".encode()
-                    )
-                    continue
+        writer.write(protocol.HEADER.pack(protocol.FILE_DATA, self.stream, length))
+        sent = 0
+        if self.use_sendfile:
+            try:
+                # os.sendfile: o kernel copia do cache de páginas para o socket
+                sent = await asyncio.get_running_loop().sendfile(
+                    writer.transport, self.file, self.offset, length, fallback=False
+                )
+            except asyncio.SendfileNotAvailableError:
+                # Sem sendfile (ex.: Windows, TLS): cópia em Python daqui em diante
+                self.use_sendfile = False
+        if not self.use_sendfile:
+            self.file.seek(self.offset)
+            chunk = self.file.read(length)
+            sent = len(chunk)
+            if self.file_hash is not None:
+                self.file_hash.update(chunk)
+            writer.write(chunk)
+            await writer.drain()
+        if sent < length:
+            # O arquivo diminuiu depois do header: o frame anunciado não pode ser
+            # completado, então a conexão é encerrada
+            raise ConnectionError("arquivo truncado durante o envio")
+        stats.sent(protocol.HEADER_SIZE + length)
+        self.offset += length
+        return False
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class Client:
+    """
+    Conexão de um cliente. Tudo o que vai para o cliente passa pela fila `outbox`
+    (limitada), esvaziada por uma única tarefa de escrita que alterna os frames
+    dos arquivos em envio com as mensagens da fila: o chat continua durante um
+    download, e um cliente lento não atrasa os outros.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info("peername")
+        self.outbox = asyncio.Queue(OUTBOX_SIZE)
+        self.files = deque()  # FileStreams em envio, em rodízio
+        self.next_stream = 1
+        self.dropped = 0
+        self.idle = False  # Nada na fila nem em envio pela tarefa de escrita
+        self.closed = False
+        # Tarefa de leitura (handle_client), cancelada se a conexão cair pelo
+        # lado da escrita
+        self.handler = asyncio.current_task()
+        self.writer_task = asyncio.create_task(self._write_loop())
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        # O asyncio sempre liga TCP_NODELAY; aqui vale a configuração
+        sock = writer.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(TCP_NODELAY))
+
+    def new_stream(self):
+        stream = self.next_stream
+        self.next_stream = stream % protocol.MAX_STREAM + 1
+        return stream
 
-                filename = parts[1]
-                print(f"Requisição recebida de {addr} para o arquivo '{filename}'.")
-
-                if not os.path.exists(filename):
-                    header = (
-                        f"NOME:{filename}\n"
-                        f"TAMANHO:0\n"
-                        f"HASH:\n"
-                        f"STATUS:NOK\n"
-                        f"HEADER_END\n"
-                    )
-                    conn.sendall(header.encode())
-                    print(
-                        f"Arquivo '{filename}' não encontrado. Notificando o cliente {addr}."
-                    )
+    async def send(self, item):
+        """
+        Enfileira esperando por espaço (respostas ao próprio cliente). Levanta
+        ConnectionResetError se a conexão já foi encerrada: a tarefa de escrita
+        não esvaziaria mais a fila.
+        """
+        if self.closed or self.writer.transport.is_closing():
+            raise ConnectionResetError("conexão encerrada")
+        self.idle = False
+        if not isinstance(item, FileStream):
+            stats.sent(len(item))  # Os frames de arquivo contam ao serem enviados
+        await self.outbox.put(item)
+
+    def offer(self, data):
+        """
+        Enfileira sem esperar (broadcast). Se a fila estiver cheia, aplica a
+        política de clientes lentos. Retorna True se a mensagem foi aceita.
+        """
+        if self.idle and not self.writer.transport.is_closing():
+            # Nada na fila nem em envio: escreve direto, sem acordar a tarefa de
+            # escrita (o transporte guarda o que o socket não aceitar de imediato)
+            self.writer.write(data)
+            if self.writer.transport.get_write_buffer_size() > WRITE_BUFFER_HIGH:
+                self.idle = False
+                self.outbox.put_nowait(b"")  # A tarefa de escrita espera o dreno
+            return True
+        try:
+            self.outbox.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            if SLOW_CLIENT_POLICY == "disconnect":
+                print(f"Cliente {self.addr} não acompanha o chat; desconectando.")
+                self.abort()
+            else:
+                if not self.dropped:
+                    print(f"Cliente {self.addr} lento: descartando mensagens de chat.")
+                self.dropped += 1
+            return False
+
+    async def _write_loop(self):
+        writer = self.writer
+        try:
+            while True:
+                # Mensagens pendentes passam na frente do próximo frame de arquivo
+                if self.files and self.outbox.empty():
+                    stream = self.files[0]
+                    if await stream.send_frame(writer):
+                        self.files.popleft()
+                        self._finished(stream)
+                    else:
+                        self.files.rotate(-1)
                     continue
+                if self.outbox.empty():
+                    self.idle = True
+                item = await self.outbox.get()
+                self.idle = False
+                if isinstance(item, FileStream):
+                    self.files.append(item)
+                else:
+                    writer.write(item)
+                    await writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f"Erro ao enviar para {self.addr}: {e}")
+        finally:
+            for stream in self.files:
+                stream.close()
+            self.abort()  # Sem a tarefa de escrita, a conexão não tem mais uso
+
+    def _finished(self, stream):
+        seconds = stream.elapsed()
+        stats.request(time.monotonic() - stream.requested)
+        stats.transfer(stream.filesize, seconds)
+        rate = stream.filesize / (1024 * 1024) / max(seconds, 1e-6)
+        print(
+            f"Envio do arquivo '{stream.filename}' para {self.addr} concluído: "
+            f"{stream.filesize} bytes em {seconds:.3f}s ({rate:.2f} MB/s)."
+        )
+
+    def abort(self):
+        """
+        Fecha a conexão sem esperar o envio do que está pendente e cancela a
+        tarefa de leitura, que pode estar parada esperando espaço na fila.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.transport.abort()
+        if self.handler is not asyncio.current_task():
+            self.handler.cancel()
+
+    async def close(self):
+        self.closed = True
+        self.writer_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+        if self.dropped:
+            print(f"{self.dropped} mensagens descartadas para {self.addr}.")
+
+
+def add_client(client):
+    global clients
+    clients = clients + (client,)
+
+
+def remove_client(client):
+    global clients
+    clients = tuple(other for other in clients if other is not client)
+
+
+def broadcast_message(message, exclude=None):
+    """
+    Envia uma mensagem de chat para todos os clientes conectados, exceto
+    `exclude`. Não espera por ninguém: cada cliente recebe a mensagem na sua
+    própria fila.
+    """
+    # Codificada uma única vez: todos os clientes recebem o mesmo objeto bytes
+    data = protocol.pack_text(protocol.CHAT, message)
+    delivered = 0
+    for client in clients:
+        if client is not exclude and client.offer(data):
+            delivered += 1
+    stats.sent(len(data) * delivered)  # Uma soma por mensagem, não por cliente
+
+
+async def send_not_found(client, stream, filename, reason=None):
+    header = {"NOME": filename, "TAMANHO": 0, "HASH": "", "STATUS": "NOK"}
+    if reason is not None:
+        header["MOTIVO"] = reason
+    await client.send(
+        protocol.pack(protocol.FILE_HEADER, protocol.format_fields(header), stream)
+    )
+
 
-                filesize = os.path.getsize(filename)
-                # Calcula o hash do arquivo (SHA-256)
-                sha256_hash = hashlib.sha256()
-                with open(filename, "rb") as f:
-                    while True:
-                        chunk = f.read(4096)
-                        if not chunk:
-                            break
-                        sha256_hash.update(chunk)
-                file_hash = sha256_hash.hexdigest()
-
-                header = (
-                    f"NOME:{filename}\n"
-                    f"TAMANHO:{filesize}\n"
-                    f"HASH:{file_hash}\n"
-                    f"STATUS:OK\n"
-                    f"HEADER_END\n"
+async def send_file(client, filename, first=None, last=None):
+    """
+    Responde a um pedido do arquivo inteiro ou, com `first`, dos bytes de
+    `first` a `last` (inclusive; None = até o fim). Na faixa, o header traz
+    INICIO e TOTAL (tamanho do arquivo) e o HASH é sempre o do arquivo inteiro,
+    para quem junta as faixas conferir no fim. Retorna True se o envio começou.
+    """
+    print(f"Requisição recebida de {client.addr} para o arquivo '{filename}'.")
+    stream = client.new_stream()
+
+    key = None
+    if os.path.isfile(filename):
+        try:
+            key, digest = digests.lookup(filename)
+        except OSError:
+            pass  # Removido entre as duas consultas
+    if key is None:
+        await send_not_found(client, stream, filename)
+        print(
+            f"Arquivo '{filename}' não encontrado. "
+            f"Notificando o cliente {client.addr}."
+        )
+        return False
+
+    filesize = key[1]
+    if first is not None:
+        if last is None:
+            last = filesize - 1
+        if not 0 <= first <= last < filesize:
+            await send_not_found(client, stream, filename, "faixa inválida")
+            return False
+
+    trailer = False
+    if digest is None:
+        if HASH_TRAILER and first is None:
+            # O envio começa já; o hash vai no FILE_END e fica no cache
+            trailer = True
+        else:
+            # Ler o arquivo inteiro bloquearia todos os clientes: o hash é
+            # calculado em uma thread do executor padrão
+            digest = await asyncio.get_running_loop().run_in_executor(
+                None, digests.compute, key
+            )
+
+    length = filesize if first is None else last - first + 1
+    header = {
+        "NOME": filename,
+        "TAMANHO": length,
+        "HASH": digest or "",
+        "STATUS": "OK",
+    }
+    if first is not None:
+        header["INICIO"] = first
+        header["TOTAL"] = filesize
+    if trailer:
+        header["TRAILER"] = "HASH"
+    await client.send(
+        protocol.pack(protocol.FILE_HEADER, protocol.format_fields(header), stream)
+    )
+    await client.send(
+        FileStream(stream, filename, length, key if trailer else None, first or 0)
+    )
+    print(
+        f"Iniciando envio do arquivo '{filename}' para {client.addr}. "
+        f"Tamanho: {length} bytes"
+        + (f" a partir do byte {first}." if first is not None else ".")
+    )
+    return True
+
+
+def stats_report():
+    """Métricas das conexões e do cache de hashes, uma por linha."""
+    cache = digests.stats()
+    cache["hit_rate"] = f"{cache['hit_rate']:.3f}"
+    return stats.report() + "".join(
+        f"digest_{name} {value}\n" for name, value in cache.items()
+    )
+
+
+async def handle_command(client, command):
+    """
+    Trata um comando do cliente. Retorna False se ele pediu para sair. Os
+    arquivos pedidos seguem em paralelo, cada um no seu stream, sem esperar o
+    fim dos anteriores; a latência deles é registrada no fim do envio.
+    """
+    if command == "Sair":
+        print(f"Cliente {client.addr} pediu para sair.")
+        return False
+
+    start = time.monotonic()
+    if command == "Estatisticas":
+        await client.send(protocol.pack_text(protocol.CONTROL, stats_report()))
+
+    elif command.startswith("Arquivo"):
+        parts = command.split(maxsplit=1)
+        if len(parts) != 2:
+            await client.send(
+                protocol.pack_text(
+                    protocol.CONTROL,
+                    "Formato de comando incorreto. Use: Arquivo <nome>\n",
                 )
-                conn.sendall(header.encode())
-                print(
-                    f"Iniciando envio do arquivo '{filename}' para {addr}. Tamanho: {filesize} bytes."
+            )
+            return True
+        if await send_file(client, parts[1]):
+            return True
+
+    elif command.startswith("Faixa"):
+        # Faixa <início>-<fim> <nome>: bytes de início a fim, inclusive (sem o
+        # fim, até o final do arquivo)
+        parts = command.split(maxsplit=2)
+        try:
+            first, last = parts[1].split("-")
+            first, last = int(first), int(last) if last else None
+            filename = parts[2]
+        except (IndexError, ValueError):
+            await client.send(
+                protocol.pack_text(
+                    protocol.CONTROL,
+                    "Formato de comando incorreto. "
+                    "Use: Faixa <início>-<fim> <nome>\n",
                 )
+            )
+            return True
+        if await send_file(client, filename, first, last):
+            return True
 
-                # Envia os dados do arquivo em blocos
-                total_sent = 0
-                with open(filename, "rb") as f:
-                    while True:
-                        chunk = f.read(4096)
-                        if not chunk:
-                            break
-                        conn.sendall(chunk)
-                        total_sent += len(chunk)
-                        print(
-                            f"Enviando arquivo '{filename}' para {addr}: {total_sent}/{filesize} bytes enviados."
-                        )
-                print(f"Envio do arquivo '{filename}' para {addr} concluído.")
+    else:
+        await client.send(
+            protocol.pack_text(protocol.CONTROL, f"Comando desconhecido: {command}\n")
+        )
+    stats.request(time.monotonic() - start)
+    return True
 
-            else:
-                # Qualquer outra mensagem é tratada como chat (não há opção explícita de chat)
-                print(f"[Chat de {addr}]: {command}")
-                broadcast_message(f"[{addr}] {command}\n", exclude_conn=conn)
-
-        except Exception as e:
-            print(f"Erro com o cliente {addr}: {e}")
-            break
-
-    # Remove o cliente da lista e fecha a conexão
-    with clients_lock:
-        for client in clients:
-            if client[0] == conn:
-                clients.remove(client)
+
+async def handle_commands(client, text):
+    """Um frame CONTROL pode trazer vários comandos, um por linha."""
+    for line in text.splitlines():
+        command = line.strip()
+        if command and not await handle_command(client, command):
+            return False
+    return True
+
+
+async def handle_client(reader, writer):
+    """Trata a conexão de cada cliente em uma tarefa do event loop."""
+    client = Client(reader, writer)
+    add_client(client)
+    stats.connection_opened()
+    print(f"Cliente conectado: {client.addr}")
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(protocol.HEADER_SIZE)
+            except asyncio.IncompleteReadError:
+                print(f"Conexão encerrada pelo cliente {client.addr}")
                 break
-    conn.close()
-    print(f"Conexão com {addr} encerrada.")
+            frame_type, _, length = protocol.HEADER.unpack(header)
+            stats.received(protocol.HEADER_SIZE + length)
+            if length > protocol.MAX_MESSAGE:
+                print(f"Frame de {length} bytes de {client.addr}; desconectando.")
+                break
+            text = (await reader.readexactly(length)).decode(errors="replace")
+            text = text.strip()
+
+            if frame_type == protocol.CHAT:
+                print(f"[Chat de {client.addr}]: {text}")
+                broadcast_message(f"[{client.addr}] {text}\n", exclude=client)
+
+            elif frame_type == protocol.CONTROL:
+                if not await handle_commands(client, text):
+                    break
 
+    except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+        print(f"Erro com o cliente {client.addr}: {e}")
+    except asyncio.CancelledError:
+        if not client.closed:
+            raise  # Servidor encerrando
+        print(f"Conexão com {client.addr} abortada.")
+    finally:
+        # Remove o cliente da lista e fecha a conexão
+        remove_client(client)
+        stats.connection_closed()
+        await client.close()
+        print(f"Conexão com {client.addr} encerrada.")
 
-def server_console_input():
+
+def server_console_input(loop, stop):
     """
     Lê o que o operador digita no console do servidor e envia a todos os clientes.
     Se o operador digitar "sair", o servidor encerra.
@@ -128,34 +485,79 @@ def server_console_input():
     while True:
         try:
             message = input()  # Aguarda a entrada do operador
-            if message.strip().lower() == "sair":
-                print("Encerrando servidor por comando do operador.")
-                os._exit(0)
-            broadcast_message(f"\n[Server] {message}\n")
-        except Exception as e:
-            print(f"Erro na entrada do servidor: {e}")
+        except EOFError:
+            return  # Sem console (servidor em segundo plano)
+        if message.strip().lower() == "sair":
+            print("Encerrando servidor por comando do operador.")
+            loop.call_soon_threadsafe(stop.set)
+            return
+        loop.call_soon_threadsafe(broadcast_message, f"\n[Server] {message}\n")
 
 
-def main():
-    host = "0.0.0.0"
-    port = 12345  # Porta escolhida (maior que 1024)
-    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_sock.bind((host, port))
-    server_sock.listen(5)
+def raise_fd_limit():
+    """Sobe o limite de descritores abertos ao máximo permitido (uma por conexão)."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def listen_socket(host, port):
+    """
+    Socket de escuta com as opções configuradas. Os buffers são ajustados antes
+    do listen: as conexões aceitas os herdam, e o SO_RCVBUF precisa estar
+    definido antes do handshake para valer na escala da janela TCP.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if REUSE_ADDRESS:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if SEND_BUFFER_BYTES is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+    if RECV_BUFFER_BYTES is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_BYTES)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    sock.setblocking(False)
+    return sock
+
+
+async def dump_metrics(interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(stats.summary())
+
+
+async def serve(host=HOST, port=PORT):
+    raise_fd_limit()
+    server = await asyncio.start_server(handle_client, sock=listen_socket(host, port))
     print(f"Servidor iniciado em {host}:{port}")
+    dump = None
+    if METRICS_INTERVAL:
+        dump = asyncio.create_task(dump_metrics(METRICS_INTERVAL))
 
     # Inicia a thread para ler entradas do operador do servidor
-    threading.Thread(target=server_console_input, daemon=True).start()
+    stop = asyncio.Event()
+    threading.Thread(
+        target=server_console_input,
+        args=(asyncio.get_running_loop(), stop),
+        daemon=True,
+    ).start()
 
-    while True:
-        try:
-            conn, addr = server_sock.accept()
-            with clients_lock:
-                clients.append((conn, addr))
-            threading.Thread(target=handle_client, args=(conn, addr)).start()
-        except Exception as e:
-            print(f"Erro ao aceitar conexão: {e}")
-            break
+    async with server:
+        await stop.wait()
+    if dump is not None:
+        dump.cancel()
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Servidor encerrado.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import server
+
+BENCH_PORT = 8099  # Porta do servidor de teste (loopback)
+
+
+def run_server(port):
+    sys.stdout = open(os.devnull, "w")  # Sem o log de requisições do servidor
+    server.run("127.0.0.1", port)
+
+
+def start_server(port):
+    """Sobe o servidor em outro processo, para não disputar o GIL com a carga."""
+    process = multiprocessing.Process(target=run_server, args=(port,), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return process
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    raise RuntimeError("servidor de teste não subiu")
+
+
+def read_response(stream):
+    """
+    Lê uma resposta HTTP de `stream` (socket.makefile("rb")). Retorna (status,
+    bytes do corpo, conexão continua, cabeçalhos) ou None se a conexão foi
+    encerrada.
+    """
+    status_line = stream.readline()
+    if not status_line:
+        return None
+    headers = {}
+    for line in iter(stream.readline, b"\r\n"):
+        if not line:
+            return None
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        size = 0
+        while True:
+            length = int(stream.readline().split(b";")[0], 16)
+            if not length:
+                break
+            size += len(stream.read(length))
+            stream.readline()
+        for line in iter(stream.readline, b"\r\n"):  # Trailers
+            if not line:
+                return None
+    else:
+        size = len(stream.read(int(headers.get("content-length", "0"))))
+    keep_alive = headers.get("connection", "").lower() != "close"
+    return int(status_line.split()[1]), size, keep_alive, headers
+
+
+def request_bytes(path, keep_alive, etag=None):
+    connection = "keep-alive" if keep_alive else "close"
+    condition = f"If-None-Match: {etag}\r\n" if etag else ""
+    return (
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: {connection}\r\n"
+        f"{condition}\r\n"
+    ).encode()
+
+
+def generate_load(address, paths, mode, depth, duration):
+    """
+    Uma conexão de carga por `duration` segundos, pedindo `paths` em rodízio:
+    "close" abre uma conexão por requisição (como o servidor original), "keep"
+    reusa a conexão e espera cada resposta, "pipeline" envia `depth` requisições
+    de uma vez antes de ler as respostas, "revalidate" é o "keep" de um
+    navegador com cache: repete o ETag recebido em If-None-Match. Retorna
+    (respostas, bytes, erros).
+    """
+    responses = received = errors = 0
+    etags = {}  # path -> último ETag recebido
+    sock = stream = None
+    deadline = time.monotonic() + duration
+    index = 0
+    while time.monotonic() < deadline:
+        batch = depth if mode == "pipeline" else 1
+        requests = [paths[(index + i) % len(paths)] for i in range(batch)]
+        index += batch
+        try:
+            if sock is None:
+                sock = socket.create_connection(address)
+                stream = sock.makefile("rb")
+            keep_alive = mode != "close"
+            sock.sendall(
+                b"".join(
+                    request_bytes(path, keep_alive, etags.get(path))
+                    for path in requests
+                )
+            )
+            for path in requests:
+                result = read_response(stream)
+                if result is None:
+                    raise ConnectionError("conexão encerrada pelo servidor")
+                status, size, keep_alive, headers = result
+                if mode == "revalidate" and "etag" in headers:
+                    etags[path] = headers["etag"]
+                responses += 1
+                received += size
+                if status >= 400:
+                    errors += 1
+        except OSError:
+            errors += 1
+            keep_alive = False
+        if not keep_alive and sock is not None:
+            stream.close()
+            sock.close()
+            sock = stream = None
+    if sock is not None:
+        stream.close()
+        sock.close()
+    return responses, received, errors
+
+
+def run_load(args):
+    """`connections` conexões de carga em threads de um processo; soma os totais."""
+    connections, load = args
+    results = [None] * connections
+
+    def worker(index):
+        results[index] = generate_load(*load)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return tuple(map(sum, zip(*results)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gerador de carga: requisições por segundo com e sem keep-alive."
+    )
+    parser.add_argument(
+        "paths", nargs="*", default=["/exemplo.html", "/teste.jpg"], metavar="PATH"
+    )
+    parser.add_argument(
+        "--server",
+        help="HOST:PORTA de um servidor em execução (padrão: sobe um no loopback)",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["close", "keep", "pipeline"],
+        choices=["close", "keep", "pipeline", "revalidate"],
+    )
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument(
+        "--processes", type=int, default=4, help="processos geradores de carga"
+    )
+    parser.add_argument("--depth", type=int, default=8, help="requisições por lote")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    process = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        address = (host, int(port))
+    else:
+        process = start_server(BENCH_PORT)
+        address = ("127.0.0.1", BENCH_PORT)
+
+    processes = min(args.processes, args.connections)
+    shares = [
+        args.connections // processes + (i < args.connections % processes)
+        for i in range(processes)
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        for mode in args.modes:
+            load = (address, args.paths, mode, args.depth, args.duration)
+            start = time.monotonic()
+            results = pool.map(run_load, [(share, load) for share in shares])
+            elapsed = time.monotonic() - start
+            responses = sum(result[0] for result in results)
+            received = sum(result[1] for result in results)
+            errors = sum(result[2] for result in results)
+            print(
+                f"{mode:>10}: {responses / elapsed:8.0f} requisições/s, "
+                f"{received / (1024 * 1024) / elapsed:7.1f} MB/s, "
+                f"{errors} erros ({args.connections} conexões)"
+            )
+    if process is not None:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Cache dos hashes de arquivos servidos. A chave identifica a versão do arquivo
+# (caminho real, tamanho, mtime em ns e inode): se qualquer um muda, a entrada
+# antiga deixa de ser encontrada e é descartada na próxima consulta ao caminho.
+# Este módulo é copiado igual em Trab01, Trab02 e Trab03 (como o metrics.py em
+# Trab02 e Trab03): cada trabalho roda sozinho a partir da sua pasta. Alterações
+# valem para todas as cópias.
+
+DIGEST_CACHE_ENTRIES = 1024  # Arquivos (versões) mantidos no cache
+DIGEST_ALGORITHM = "sha256"
+DIGEST_BLOCK = 1024 * 1024  # Leitura do arquivo ao calcular o hash
+
+
+def file_key(path):
+    """Identidade da versão atual do arquivo. Levanta OSError se não existir."""
+    info = os.stat(path)
+    return os.path.realpath(path), info.st_size, info.st_mtime_ns, info.st_ino
+
+
+class DigestCache:
+    """
+    Cache LRU de hashes, seguro para uso em várias threads. O hash de um arquivo
+    só é guardado se o arquivo não mudou enquanto era lido.
+    """
+
+    def __init__(self, max_entries=DIGEST_CACHE_ENTRIES, algorithm=DIGEST_ALGORITHM):
+        self.max_entries = max_entries
+        self.algorithm = algorithm
+        self.entries = OrderedDict()  # chave -> hash hexadecimal
+        self.versions = {}  # caminho real -> chave da versão em cache
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def new_hash(self):
+        """Objeto hashlib para quem calcula o hash enquanto envia o arquivo."""
+        return hashlib.new(self.algorithm)
+
+    def lookup(self, path):
+        """
+        Retorna (chave, hash) da versão atual de `path`; hash é None se ela ainda
+        não estiver no cache. Levanta OSError se o arquivo não existir. É a
+        consulta contada nas estatísticas: uma por requisição.
+        """
+        key = file_key(path)
+        with self.lock:
+            digest = self.entries.get(key)
+            if digest is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+        return key, digest
+
+    def peek(self, key):
+        """Hash da versão `key` se estiver no cache, sem contar nas estatísticas."""
+        with self.lock:
+            return self.entries.get(key)
+
+    def store(self, key, digest):
+        """Guarda o hash de `key` se ela ainda for a versão atual do arquivo."""
+        try:
+            if file_key(key[0]) != key:
+                return  # Mudou durante a leitura: o hash pode não corresponder
+        except OSError:
+            return
+        with self.lock:
+            old = self.versions.get(key[0])
+            if old is not None and old != key:
+                self.entries.pop(old, None)
+            self.versions[key[0]] = key
+            self.entries[key] = digest
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                if self.versions.get(evicted[0]) == evicted:
+                    del self.versions[evicted[0]]
+
+    def compute(self, key):
+        """
+        Calcula o hash da versão `key` (de um lookup sem acerto) lendo o arquivo e
+        o guarda. Bloqueia durante a leitura.
+        """
+        file_hash = self.new_hash()
+        with open(key[0], "rb") as f:
+            for block in iter(lambda: f.read(DIGEST_BLOCK), b""):
+                file_hash.update(block)
+        digest = file_hash.hexdigest()
+        self.store(key, digest)
+        return digest
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,164 @@
+import bisect
+import threading
+import time
+
+# Métricas de conexão do servidor: conexões ativas, bytes recebidos e enviados,
+# histograma da latência das requisições, vazão das transferências e estouros da
+# fila de accept. Seguro para uso em várias threads (Trab03) e barato o bastante
+# para o event loop (Trab02): cada registro é uma soma sob um lock.
+# Este módulo é copiado igual em Trab02 e Trab03 (como o digest_cache.py): cada
+# trabalho roda sozinho a partir da sua pasta. Alterações valem para as duas.
+
+# Limites superiores (em segundos) das faixas do histograma de latência
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def listen_counters():
+    """
+    Contadores do sistema (Linux) de conexões perdidas na fila de accept:
+    (ListenOverflows, ListenDrops). São de todos os sockets da máquina, não só
+    deste servidor. None se indisponíveis.
+    """
+    try:
+        with open("/proc/net/netstat") as f:
+            lines = [line.split() for line in f if line.startswith("TcpExt:")]
+        counters = dict(zip(lines[0][1:], map(int, lines[1][1:])))
+        return counters["ListenOverflows"], counters["ListenDrops"]
+    except (OSError, IndexError, KeyError, ValueError):
+        return None
+
+
+class Histogram:
+    """Contagem de amostras por faixa (LATENCY_BUCKETS + uma faixa sem limite)."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, fraction):
+        """Limite superior da faixa que contém o percentil (None sem amostras)."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.listen_start = listen_counters()
+        self.active = 0
+        self.connections = 0
+        self.rejections = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram()
+        self.transfers = 0
+        self.transfer_bytes = 0
+        self.transfer_seconds = 0.0
+
+    def connection_opened(self):
+        with self.lock:
+            self.active += 1
+            self.connections += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.active -= 1
+
+    def rejected(self):
+        """Registra uma conexão ou requisição recusada por sobrecarga."""
+        with self.lock:
+            self.rejections += 1
+
+    def received(self, size):
+        with self.lock:
+            self.bytes_in += size
+
+    def sent(self, size):
+        with self.lock:
+            self.bytes_out += size
+
+    def request(self, seconds):
+        """Registra a latência de uma requisição atendida (até o último byte)."""
+        with self.lock:
+            self.latency.observe(seconds)
+
+    def transfer(self, size, seconds):
+        """Registra uma transferência de arquivo concluída."""
+        with self.lock:
+            self.transfers += 1
+            self.transfer_bytes += size
+            self.transfer_seconds += seconds
+
+    def stats(self):
+        with self.lock:
+            latency = self.latency
+            stats = {
+                "uptime": f"{time.monotonic() - self.started:.0f}",
+                "active": self.active,
+                "connections": self.connections,
+                "rejected": self.rejections,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "requests": latency.count,
+                "latency_avg": f"{latency.total / max(latency.count, 1):.6f}",
+            }
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                stats[f"latency_{name}"] = latency.percentile(fraction)
+            for bound, count in zip(latency.bounds, latency.counts):
+                stats[f"latency_le_{bound}"] = count
+            stats["latency_le_inf"] = latency.counts[-1]
+            stats["transfers"] = self.transfers
+            # Vazão média por transferência: bytes / soma das durações
+            rate = self.transfer_bytes / max(self.transfer_seconds, 1e-9)
+            stats["transfer_mbps"] = f"{rate / (1024 * 1024):.2f}"
+        listen = listen_counters()
+        if listen is not None and self.listen_start is not None:
+            stats["listen_overflows"] = listen[0] - self.listen_start[0]
+            stats["listen_drops"] = listen[1] - self.listen_start[1]
+        return stats
+
+    def report(self):
+        """Texto com uma métrica por linha ("nome valor")."""
+        return "".join(f"{name} {value}\n" for name, value in self.stats().items())
+
+    def summary(self):
+        """Resumo em uma linha, para o dump periódico no console."""
+        stats = self.stats()
+        return (
+            f"[Métricas] {stats['active']} conexões ativas "
+            f"({stats['connections']} no total), {stats['bytes_in']} bytes "
+            f"recebidos, {stats['bytes_out']} enviados, {stats['requests']} "
+            f"requisições (p50 {stats['latency_p50']}s, "
+            f"p99 {stats['latency_p99']}s), "
+            f"{stats['transfers']} transferências a {stats['transfer_mbps']} MB/s, "
+            f"{stats.get('listen_overflows', '?')} estouros da fila de accept"
+        )
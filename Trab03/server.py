@@ -1,160 +1,863 @@
 #!/usr/bin/env python3
+import asyncio
 import socket
-import threading
+import multiprocessing
 import os
-import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 import mimetypes
+import stat
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 
+try:
+    import resource
+except ImportError:  # Windows: o limite de descritores não é ajustável daqui
+    resource = None
 
-def serve_file(conn, addr, filename):
+import digest_cache
+import metrics
+
+# Configuração do servidor
+HOST = "0.0.0.0"
+PORT = 8080  # Porta escolhida (maior que 1024)
+BACKLOG = 4096  # Conexões esperando accept (o kernel ainda limita por somaxconn)
+REUSE_ADDRESS = True  # SO_REUSEADDR: reinicia sem esperar o TIME_WAIT da porta
+# Sem o algoritmo de Nagle: os cabeçalhos, enviados antes do corpo, não ficam
+# esperando o ACK atrasado do cliente
+TCP_NODELAY = True
+# SO_SNDBUF / SO_RCVBUF das conexões, em bytes. None deixa o ajuste automático do
+# sistema; um valor fixo o desliga (no Linux) e limita a janela TCP
+SEND_BUFFER_BYTES = None
+RECV_BUFFER_BYTES = None
+METRICS_INTERVAL = 0  # Segundos entre resumos de métricas no console (0: nunca)
+KEEP_ALIVE_TIMEOUT = 5  # Segundos de espera pela próxima requisição na conexão
+KEEP_ALIVE_MAX = 1000  # Requisições atendidas por conexão antes de fechá-la
+MAX_HEADER_SIZE = 8192  # Maior cabeçalho de requisição aceito
+
+# Conexões são atendidas por um único event loop (sem uma thread cada); só o
+# trabalho de disco que bloqueia (hash, leitura sem sendfile) vai para um pool
+# limitado de threads
+MAX_CONNECTIONS = 1024  # Conexões simultâneas; acima disso, 503 e fechamento
+DISK_WORKERS = 4  # Threads do pool de disco
+DISK_QUEUE = 64  # Tarefas de disco pendentes antes de recusar hashes novos com 503
+RETRY_AFTER = 1  # Segundos sugeridos ao cliente no Retry-After das respostas 503
+USE_SENDFILE = True  # Envia arquivos com os.sendfile quando o sistema permite
+# Processos servindo a mesma porta com SO_REUSEPORT (o kernel distribui as
+# conexões entre eles); use os.cpu_count() para ocupar todos os núcleos. Cada
+# processo tem seu cache de hashes e suas métricas
+PROCESSES = 1
+
+FILE_BLOCK = 64 * 1024  # Leitura do arquivo no envio chunked
+# Hash do arquivo ainda fora do cache: False calcula antes de enviar os
+# cabeçalhos; True envia já, em chunked, e manda o hash no trailer X-HASH
+HASH_TRAILER = False
+
+# Cache-Control das respostas de arquivos: o navegador reusa a cópia por max-age
+# segundos sem perguntar; depois, revalida com If-None-Match / If-Modified-Since
+# e recebe 304 (sem corpo) se o arquivo não mudou
+CACHE_CONTROL = "public, max-age=60"
+
+MAX_RANGES = 16  # Faixas por requisição; com mais, o Range é ignorado (200)
+
+# Respostas prontas de arquivos pequenos, servidas com uma única escrita
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024  # Memória total do cache (0: desligado)
+RESPONSE_CACHE_MAX_FILE = 256 * 1024  # Maior arquivo cuja resposta vai para o cache
+
+
+class ResponseCache:
     """
-    Verifica se o arquivo existe e, se existir, envia-o com os cabeçalhos HTTP adequados.
-    Se o arquivo não existir, envia uma resposta 404.
+    Cache LRU de respostas prontas (cabeçalhos + corpo) de arquivos pequenos,
+    por nome pedido e keep-alive (que muda o cabeçalho Connection). Cada entrada
+    guarda a versão do arquivo (caminho real, tamanho, mtime em ns e inode) e só
+    vale enquanto um stat do arquivo devolver a mesma versão.
     """
-    if not os.path.exists(filename):
-        response_body = f"Arquivo '{filename}' nao encontrado."
-        response = (
-            "HTTP/1.1 404 Not Found\r\n"
-            f"Content-Length: {len(response_body)}\r\n"
-            "Content-Type: text/plain\r\n\r\n" + response_body
-        )
-        conn.sendall(response.encode())
-        print(f"[{addr}] Arquivo '{filename}' nao encontrado.")
-        return
 
-    filesize = os.path.getsize(filename)
-    # Calcula o hash do arquivo (SHA-256)
-    sha256_hash = hashlib.sha256()
+    def __init__(self, max_bytes, max_file):
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self.entries = OrderedDict()  # (nome, keep-alive) -> (versão, resposta)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def accepts(self, filesize):
+        return self.max_bytes > 0 and filesize <= self.max_file
+
+    def get(self, filename, keep_alive, key):
+        """Resposta pronta para a versão `key` do arquivo, ou None."""
+        entry = self.entries.get((filename, keep_alive))
+        if entry is None:
+            return None
+        if key != entry[0]:
+            self._remove((filename, keep_alive))  # Arquivo mudou ou sumiu
+            return None
+        self.entries.move_to_end((filename, keep_alive))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, filename, keep_alive, key, response):
+        """Guarda uma resposta montada após uma falta (conta como miss)."""
+        self.misses += 1
+        if len(response) > self.max_bytes:
+            return
+        self._remove((filename, keep_alive))
+        self.entries[(filename, keep_alive)] = (key, response)
+        self.size += len(response)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def _remove(self, entry_key):
+        entry = self.entries.pop(entry_key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{self.hits / lookups if lookups else 0:.3f}",
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+        }
+
+
+# Hashes dos arquivos servidos, compartilhados com as threads do pool de disco
+digests = digest_cache.DigestCache()
+responses = ResponseCache(RESPONSE_CACHE_BYTES, RESPONSE_CACHE_MAX_FILE)
+# Métricas das conexões, servidas em /metrics
+stats = metrics.Metrics()
+# Estado do event loop (só acessado na thread dele)
+active_connections = 0
+disk_pending = 0
+
+
+async def send(writer, data):
+    writer.write(data)
+    stats.sent(len(data))
+    await writer.drain()
+
+
+async def run_disk(function, *args):
+    """Executa trabalho de disco bloqueante no pool limitado (DISK_WORKERS)."""
+    global disk_pending
+    disk_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+    finally:
+        disk_pending -= 1
+
+
+def read_block(f, file_hash):
+    """Lê o próximo bloco do arquivo e o soma ao hash (no pool de disco)."""
+    chunk = f.read(FILE_BLOCK)
+    file_hash.update(chunk)
+    return chunk
+
+
+async def send_chunked(writer, filename, key):
+    """
+    Envia o arquivo em Transfer-Encoding chunked, calculando o hash sobre os
+    bytes enviados; o hash segue no trailer X-HASH e fica no cache.
+    """
+    file_hash = digests.new_hash()
     with open(filename, "rb") as f:
         while True:
-            chunk = f.read(4096)
+            chunk = await run_disk(read_block, f, file_hash)
             if not chunk:
                 break
-            sha256_hash.update(chunk)
-    file_hash = sha256_hash.hexdigest()
+            await send(writer, b"%x\r\n%b\r\n" % (len(chunk), chunk))
+    digest = file_hash.hexdigest()
+    await send(writer, f"0\r\nX-HASH: {digest}\r\n\r\n".encode())
+    digests.store(key, digest)
+
+
+def sendfile_now(writer, f, offset, count):
+    """
+    Tenta enviar `count` bytes do arquivo a partir de `offset` já, com
+    os.sendfile direto no socket (não bloqueante), enquanto ele aceitar. Só vale
+    com o buffer do transporte vazio, para não passar na frente de dados já
+    enfileirados. Retorna os bytes enviados.
+    """
+    if not hasattr(os, "sendfile") or writer.transport.get_write_buffer_size():
+        return 0
+    out = writer.get_extra_info("socket").fileno()
+    sent = 0
+    try:
+        while sent < count:
+            size = os.sendfile(out, f.fileno(), offset + sent, count - sent)
+            if not size:
+                break  # Fim do arquivo
+            sent += size
+    except BlockingIOError:
+        pass  # Buffer do socket cheio: o resto vai pelo event loop
+    return sent
+
+
+async def send_range(writer, f, offset, count):
+    """
+    Envia `count` bytes do arquivo aberto `f` a partir de `offset`. Com
+    sendfile, o kernel copia do cache de páginas para o socket a partir do
+    deslocamento, sem ler o começo do arquivo; sem ele, os blocos são lidos no
+    pool de disco.
+    """
+    if USE_SENDFILE:
+        # Arquivos pequenos costumam caber inteiros no buffer do socket: o
+        # loop.sendfile (que espera o socket e registra callbacks) fica só
+        # para o que sobrar
+        sent = sendfile_now(writer, f, offset, count)
+        if sent < count:
+            sent += await asyncio.get_running_loop().sendfile(
+                writer.transport, f, offset + sent, count - sent
+            )
+        stats.sent(sent)
+    else:
+        sent = 0
+        f.seek(offset)
+        while sent < count:
+            # Nunca além do Content-Length, mesmo que o arquivo tenha crescido
+            chunk = await run_disk(f.read, min(FILE_BLOCK, count - sent))
+            if not chunk:
+                break
+            await send(writer, chunk)
+            sent += len(chunk)
+    if sent < count:
+        # Diminuiu depois dos cabeçalhos: a conexão não pode ser reusada
+        raise ConnectionError("arquivo truncado durante o envio")
+
 
+async def send_body(writer, filename, filesize):
+    """Envia `filesize` bytes do arquivo (o Content-Length anunciado)."""
+    with open(filename, "rb") as f:
+        await send_range(writer, f, 0, filesize)
+
+
+def content_type_of(filename):
     # Determina o Content-Type com base na extensão do arquivo
     content_type, _ = mimetypes.guess_type(filename)
     if content_type is None:
         content_type = "text/plain"
+    return content_type
+
+
+def entity_tag(key):
+    """
+    ETag da versão do arquivo (inode, tamanho e mtime em ns): muda a cada
+    modificação e, ao contrário do hash, sai de um stat, sem ler o arquivo.
+    """
+    _, size, mtime_ns, inode = key
+    return f'"{inode:x}-{size:x}-{mtime_ns:x}"'
+
+
+def validator_headers(key):
+    return [
+        f"ETag: {entity_tag(key)}",
+        f"Last-Modified: {formatdate(key[2] / 1e9, usegmt=True)}",
+        f"Cache-Control: {CACHE_CONTROL}",
+    ]
+
+
+def not_modified(request_headers, key):
+    """
+    A cópia do cliente ainda vale? If-None-Match, se presente, decide sozinho
+    (RFC 9110); senão, vale If-Modified-Since (resolução de segundos).
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return entity_tag(key) in tags
+    since = request_headers.get("if-modified-since")
+    if since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False  # Data inválida: o cabeçalho é ignorado
+    return key[2] // 1_000_000_000 <= since
+
+
+def parse_range(value, filesize):
+    """
+    Faixas de "Range: bytes=..." como (início, fim), inclusivos e limitados ao
+    arquivo. Retorna None se o cabeçalho deve ser ignorado (sintaxe inválida,
+    outra unidade, faixas demais: a resposta é o arquivo inteiro) e [] se
+    nenhuma faixa cabe no arquivo (416).
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or spec.count(",") >= MAX_RANGES:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash or not (first + last).isdigit():
+            return None
+        if not first:
+            # Sufixo "-n": os últimos n bytes
+            length = min(int(last), filesize)
+            if length:
+                ranges.append((filesize - length, filesize - 1))
+            continue
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        last = int(last) if last else filesize - 1
+        if first < filesize:
+            ranges.append((first, min(last, filesize - 1)))
+    return ranges
+
+
+def range_applies(request_headers, key):
+    """
+    If-Range: o Range só vale se a cópia parcial do cliente for desta versão do
+    arquivo (o mesmo ETag, ou a mesma data de Last-Modified); senão, a resposta
+    é o arquivo inteiro.
+    """
+    if_range = request_headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        return if_range == entity_tag(key)  # ETag fraco nunca confere aqui
+    return if_range == formatdate(key[2] / 1e9, usegmt=True)
 
+
+async def serve_ranges(writer, addr, filename, key, ranges, keep_alive):
+    """
+    206 Partial Content: uma faixa vai com Content-Range; várias, como partes de
+    um multipart/byteranges. Cada faixa sai por sendfile a partir do seu
+    deslocamento. O X-HASH (do arquivo inteiro) só vai se já estiver no cache:
+    uma faixa não justifica ler o arquivo todo.
+    """
+    filesize = key[1]
+    content_type = content_type_of(filename)
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        parts = [(b"", first, last)]
+        closing = b""
+        body_headers = [
+            f"Content-Length: {last - first + 1}",
+            f"Content-Range: bytes {first}-{last}/{filesize}",
+            f"Content-Type: {content_type}",
+        ]
+    else:
+        boundary = os.urandom(12).hex()
+        parts = [
+            (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {first}-{last}/{filesize}\r\n\r\n".encode(),
+                first,
+                last,
+            )
+            for first, last in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode()
+        length = len(closing) + sum(
+            len(header) + last - first + 1 for header, first, last in parts
+        )
+        body_headers = [
+            f"Content-Length: {length}",
+            f"Content-Type: multipart/byteranges; boundary={boundary}",
+        ]
+    file_hash = digests.peek(key)
+    headers = [
+        "HTTP/1.1 206 Partial Content",
+        *body_headers,
+        *([f"X-HASH: {file_hash}"] if file_hash else []),
+        f"X-NOME: {filename}",
+        f"X-TAMANHO: {filesize}",
+        "X-STATUS: OK",
+        "Accept-Ranges: bytes",
+        *validator_headers(key),
+        connection_header(keep_alive),
+        "",  # Linha em branco que separa cabeçalhos do corpo
+        "",
+    ]
+    await send(writer, "\r\n".join(headers).encode())
+    start = time.monotonic()
+    print(
+        f"[{addr}] Iniciando envio de {len(ranges)} faixa(s) do arquivo "
+        f"'{filename}': " + ", ".join(f"{first}-{last}" for _, first, last in parts)
+    )
+    sent = 0
+    with open(filename, "rb") as f:
+        for header, first, last in parts:
+            if header:
+                await send(writer, header)
+            await send_range(writer, f, first, last - first + 1)
+            sent += last - first + 1
+    if closing:
+        await send(writer, closing)
+    stats.transfer(sent, time.monotonic() - start)
+    print(f"[{addr}] Envio das faixas do arquivo '{filename}' concluido.")
+    return keep_alive
+
+
+async def send_not_modified(writer, key, keep_alive):
+    response = (
+        "HTTP/1.1 304 Not Modified\r\n"
+        + "".join(f"{header}\r\n" for header in validator_headers(key))
+        + f"{connection_header(keep_alive)}\r\n\r\n"
+    )
+    await send(writer, response.encode())
+
+
+def file_headers(filename, key, file_hash, keep_alive, trailer=False):
+    filesize = key[1]
+    if trailer:
+        length_headers = ["Transfer-Encoding: chunked", "Trailer: X-HASH"]
+    else:
+        length_headers = [f"Content-Length: {filesize}", f"X-HASH: {file_hash}"]
     headers = [
         "HTTP/1.1 200 OK",
-        f"Content-Length: {filesize}",
+        *length_headers,
         f"X-NOME: {filename}",
         f"X-TAMANHO: {filesize}",
-        f"X-HASH: {file_hash}",
         "X-STATUS: OK",
-        f"Content-Type: {content_type}",
+        f"Content-Type: {content_type_of(filename)}",
+        "Accept-Ranges: bytes",
+        *validator_headers(key),
+        connection_header(keep_alive),
         "",  # Linha em branco que separa cabeçalhos do corpo
         "",
     ]
-    header_str = "\r\n".join(headers)
-    conn.sendall(header_str.encode())
+    return "\r\n".join(headers).encode()
+
+
+def load_small_file(filename):
+    """
+    Lê um arquivo pequeno inteiro e calcula o hash sobre os próprios bytes lidos
+    (no pool de disco). Retorna (versão do arquivo, corpo, hash), ou None se o
+    arquivo mudou durante a leitura.
+    """
+    with open(filename, "rb") as f:
+        before = os.fstat(f.fileno())
+        body = f.read()
+        after = os.fstat(f.fileno())
+    version = (before.st_size, before.st_mtime_ns, before.st_ino)
+    if version != (after.st_size, after.st_mtime_ns, after.st_ino):
+        return None
+    if len(body) != before.st_size:
+        return None
+    file_hash = digests.new_hash()
+    file_hash.update(body)
+    return (os.path.realpath(filename), *version), body, file_hash.hexdigest()
+
+
+async def serve_file(
+    writer, addr, filename, chunked_ok=False, keep_alive=False, request_headers=None
+):
+    """
+    Verifica se o arquivo existe e, se existir, envia-o com os cabeçalhos HTTP adequados.
+    Se o arquivo não existir, envia uma resposta 404. `chunked_ok` indica que o
+    cliente aceita Transfer-Encoding chunked (HTTP/1.1); `keep_alive`, que a
+    conexão continua depois da resposta. Se `request_headers` mostrarem que a
+    cópia do cliente ainda vale, responde 304 sem ler o arquivo; se pedirem
+    faixas (Range), responde 206 só com elas. Retorna se a conexão continua de
+    fato (não continua depois de um 503).
+    """
+    try:
+        info = os.stat(filename)
+    except OSError:
+        info = None
+    if info is None or not stat.S_ISREG(info.st_mode):
+        response_body = f"Arquivo '{filename}' nao encontrado."
+        await send_response(
+            writer, "404 Not Found", response_body, keep_alive=keep_alive
+        )
+        print(f"[{addr}] Arquivo '{filename}' nao encontrado.")
+        return keep_alive
+
+    # Versão atual do arquivo, no formato das chaves do cache de hashes
+    version = (os.path.realpath(filename), info.st_size, info.st_mtime_ns, info.st_ino)
+    if request_headers and not_modified(request_headers, version):
+        await send_not_modified(writer, version, keep_alive)
+        print(f"[{addr}] Arquivo '{filename}' nao modificado (304).")
+        return keep_alive
+
+    if request_headers and "range" in request_headers:
+        ranges = None
+        if range_applies(request_headers, version):
+            ranges = parse_range(request_headers["range"], version[1])
+        if ranges == []:
+            await send_response(
+                writer,
+                "416 Range Not Satisfiable",
+                f"Faixa fora do arquivo '{filename}' ({version[1]} bytes).",
+                keep_alive=keep_alive,
+                extra=[f"Content-Range: bytes */{version[1]}"],
+            )
+            print(f"[{addr}] Faixa invalida para o arquivo '{filename}' (416).")
+            return keep_alive
+        if ranges:
+            return await serve_ranges(
+                writer, addr, filename, version, ranges, keep_alive
+            )
+
+    response = responses.get(filename, keep_alive, version)
+    if response is not None:
+        # Resposta pronta em memória: uma única escrita, sem abrir o arquivo
+        await send(writer, response)
+        print(f"[{addr}] Arquivo '{filename}' enviado do cache de respostas.")
+        return keep_alive
+
+    key, file_hash = digests.lookup(filename)
+    filesize = key[1]
+    # Arquivos pequenos são lidos inteiros e a resposta completa vai para o cache
+    cacheable = responses.accepts(filesize)
+    # Hash fora do cache: com HASH_TRAILER (e HTTP/1.1) o envio começa já, em
+    # chunked, e o hash vai no trailer; senão é calculado antes dos cabeçalhos
+    trailer = file_hash is None and HASH_TRAILER and chunked_ok and not cacheable
+    if (file_hash is None or cacheable) and disk_pending >= DISK_QUEUE:
+        # Admissão: o pool de disco já tem trabalho demais acumulado
+        await send_overloaded(writer, addr)
+        return False
+
+    if cacheable:
+        loaded = await run_disk(load_small_file, filename)
+        if loaded is not None:
+            key, body, file_hash = loaded
+            digests.store(key, file_hash)
+            response = file_headers(filename, key, file_hash, keep_alive) + body
+            responses.put(filename, keep_alive, key, response)
+            await send(writer, response)
+            print(f"[{addr}] Arquivo '{filename}' ({key[1]} bytes) enviado.")
+            return keep_alive
+        # Mudou durante a leitura: segue pelo envio normal
+
+    if file_hash is None and not trailer:
+        file_hash = await run_disk(digests.compute, key)
+
+    await send(writer, file_headers(filename, key, file_hash, keep_alive, trailer))
+    start = time.monotonic()
+    content_type = content_type_of(filename)
     print(
         f"[{addr}] Iniciando envio do arquivo '{filename}' ({filesize} bytes, Content-Type: {content_type})."
     )
-    total_sent = 0
-    with open(filename, "rb") as f:
-        while True:
-            chunk = f.read(4096)
-            if not chunk:
-                break
-            conn.sendall(chunk)
-            total_sent += len(chunk)
-            print(f"[{addr}] {total_sent}/{filesize} bytes enviados.")
+    if trailer:
+        await send_chunked(writer, filename, key)
+    else:
+        await send_body(writer, filename, filesize)
+    stats.transfer(filesize, time.monotonic() - start)
     print(f"[{addr}] Envio do arquivo '{filename}' concluido.")
+    return keep_alive
 
 
-def handle_client(conn, addr):
-    print(f"Conexao estabelecida com {addr}")
+async def read_request(reader):
+    """
+    Lê a próxima requisição da conexão, linha a linha até a linha em branco que
+    encerra os cabeçalhos. Com pipelining, as requisições seguintes ficam no
+    buffer do `reader`. Retorna (linha de requisição, cabeçalhos em minúsculas)
+    ou None se o cliente fechou a conexão. Levanta ValueError se a requisição
+    for inválida.
+    """
+    lines = []
+    size = 0
+    while True:
+        # readline levanta ValueError para linhas maiores que o limite do reader
+        line = await reader.readline()
+        if not line:
+            return None
+        size += len(line)
+        stats.received(len(line))
+        if size > MAX_HEADER_SIZE:
+            raise ValueError("Cabecalho da requisicao muito grande.")
+        line = line.rstrip(b"\r\n")
+        if not line:
+            if lines:
+                break
+            continue  # Linhas em branco antes da requisição são ignoradas
+        lines.append(line.decode("latin-1"))
+
+    headers = {}
+    for line in lines[1:]:
+        name, colon, value = line.partition(":")
+        if colon:
+            headers[name.strip().lower()] = value.strip()
+
+    # O corpo (não usado em GET) é descartado, para não ser lido como a
+    # próxima requisição
     try:
-        # Lê a requisição HTTP (limitando a 8KB para este exemplo)
-        request = conn.recv(8192).decode()
-        if not request:
-            conn.close()
-            return
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise ValueError("Content-Length invalido.") from None
+    while length > 0:
+        data = await reader.read(min(length, FILE_BLOCK))
+        if not data:
+            return None
+        stats.received(len(data))
+        length -= len(data)
+    return lines[0], headers
 
-        # Exibe a primeira linha da requisição (por exemplo: GET /Arquivo?nome=exemplo.html HTTP/1.1)
-        request_line = request.splitlines()[0]
-        print(f"[{addr}] Requisição: {request_line}")
 
-        parts = request_line.split()
-        if len(parts) < 2:
-            conn.close()
-            return
+def wants_keep_alive(version, headers):
+    """HTTP/1.1 mantém a conexão salvo "Connection: close"; HTTP/1.0 só a pedido."""
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        return "close" not in connection
+    return "keep-alive" in connection
+
+
+def connection_header(keep_alive):
+    if keep_alive:
+        return f"Connection: keep-alive\r\nKeep-Alive: timeout={KEEP_ALIVE_TIMEOUT}"
+    return "Connection: close"
+
+
+async def send_response(
+    writer, status, body, content_type="text/plain", keep_alive=False, extra=()
+):
+    """Envia uma resposta pequena, montada de uma vez (cabeçalhos e corpo)."""
+    body = body.encode()
+    response = (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        + "".join(f"{header}\r\n" for header in extra)
+        + f"{connection_header(keep_alive)}\r\n\r\n"
+    )
+    await send(writer, response.encode() + body)
+
+
+async def send_overloaded(writer, addr):
+    stats.rejected()
+    print(f"[{addr}] Servidor sobrecarregado: respondendo 503.")
+    await send_response(
+        writer,
+        "503 Service Unavailable",
+        "Servidor sobrecarregado, tente novamente.",
+        extra=[f"Retry-After: {RETRY_AFTER}"],
+    )
+
+
+async def handle_request(writer, addr, request_line, headers, keep_alive_ok):
+    """
+    Atende uma requisição. Retorna True se a conexão continua aberta para a
+    próxima (keep-alive).
+    """
+    # Exibe a primeira linha da requisição (por exemplo: GET /Arquivo?nome=exemplo.html HTTP/1.1)
+    print(f"[{addr}] Requisição: {request_line}")
+
+    parts = request_line.split()
+    if len(parts) < 2:
+        await send_response(writer, "400 Bad Request", "Requisicao invalida.")
+        return False
+
+    method, path = parts[0], parts[1]
+    version = parts[2] if len(parts) > 2 else "HTTP/1.0"
+    chunked_ok = version == "HTTP/1.1"
+    keep_alive = keep_alive_ok and wants_keep_alive(version, headers)
+    parsed_url = urlparse(path)
 
-        method, path = parts[0], parts[1]
-        parsed_url = urlparse(path)
-
-        # Se a URL for /Arquivo, usamos o parâmetro de query string para obter o nome do arquivo
-        if parsed_url.path.lower() == "/arquivo":
-            qs = parse_qs(parsed_url.query)
-            filename_list = qs.get("nome")
-            if not filename_list:
-                response_body = "Parametro 'nome' ausente."
-                response = (
-                    "HTTP/1.1 400 Bad Request\r\n"
-                    f"Content-Length: {len(response_body)}\r\n"
-                    "Content-Type: text/plain\r\n\r\n" + response_body
-                )
-                conn.sendall(response.encode())
-            else:
-                filename = filename_list[0]
-                serve_file(conn, addr, filename)
-
-        # Se a URL for a raiz, envia uma página HTML com instruções
-        elif parsed_url.path == "/":
-            response_body = (
-                "<html>\n"
-                "<head><title>Pagina Inicial</title></head>\n"
-                "<body>\n"
-                "Bem-vindo ao servidor TCP com sockets!<br>\n"
-                "Para solicitar um arquivo via query, use a URL:<br>\n"
-                "/Arquivo?nome=seuarquivo.ext<br>\n"
-                "Ou acesse diretamente um arquivo, por exemplo:<br>\n"
-                "http://localhost:8080/exemplo.html<br>\n"
-                "Certifique-se de que os arquivos estao na mesma pasta do servidor.\n"
-                "</body>\n"
-                "</html>"
+    # Se a URL for /Arquivo, usamos o parâmetro de query string para obter o nome do arquivo
+    if parsed_url.path.lower() == "/arquivo":
+        qs = parse_qs(parsed_url.query)
+        filename_list = qs.get("nome")
+        if not filename_list:
+            await send_response(
+                writer,
+                "400 Bad Request",
+                "Parametro 'nome' ausente.",
+                keep_alive=keep_alive,
             )
-            response = (
-                "HTTP/1.1 200 OK\r\n"
-                f"Content-Length: {len(response_body)}\r\n"
-                "Content-Type: text/html\r\n\r\n" + response_body
+        else:
+            filename = filename_list[0]
+            return await serve_file(
+                writer, addr, filename, chunked_ok, keep_alive, headers
             )
-            conn.sendall(response.encode())
 
-        # Para qualquer outro caminho, trata-o como uma requisição direta de arquivo
-        else:
-            # Remove a barra inicial para obter o nome do arquivo
-            filename = parsed_url.path.lstrip("/")
-            serve_file(conn, addr, filename)
+    # Se a URL for a raiz, envia uma página HTML com instruções
+    elif parsed_url.path == "/":
+        response_body = (
+            "<html>\n"
+            "<head><title>Pagina Inicial</title></head>\n"
+            "<body>\n"
+            "Bem-vindo ao servidor TCP com sockets!<br>\n"
+            "Para solicitar um arquivo via query, use a URL:<br>\n"
+            "/Arquivo?nome=seuarquivo.ext<br>\n"
+            "Ou acesse diretamente um arquivo, por exemplo:<br>\n"
+            "http://localhost:8080/exemplo.html<br>\n"
+            "Certifique-se de que os arquivos estao na mesma pasta do servidor.\n"
+            "</body>\n"
+            "</html>"
+        )
+        await send_response(writer, "200 OK", response_body, "text/html", keep_alive)
+
+    # Métricas do servidor e do cache de hashes, uma por linha
+    elif parsed_url.path == "/metrics":
+        await send_response(writer, "200 OK", stats_report(), keep_alive=keep_alive)
+
+    # Para qualquer outro caminho, trata-o como uma requisição direta de arquivo
+    else:
+        # Remove a barra inicial para obter o nome do arquivo
+        filename = parsed_url.path.lstrip("/")
+        return await serve_file(writer, addr, filename, chunked_ok, keep_alive, headers)
+    return keep_alive
+
+
+async def handle_client(reader, writer):
+    """
+    Atende as requisições de uma conexão em sequência (keep-alive), em uma
+    tarefa do event loop. Requisições enviadas de uma vez (pipelining) ficam no
+    buffer do reader e são respondidas na ordem.
+    """
+    global active_connections
+    addr = writer.get_extra_info("peername")
+    if active_connections >= MAX_CONNECTIONS:
+        # Admissão: acima do limite, a conexão recebe 503 sem ser lida
+        try:
+            await send_overloaded(writer, addr)
+        except (ConnectionError, OSError):
+            pass
+        writer.close()
+        return
+
+    active_connections += 1
+    stats.connection_opened()
+    # O asyncio sempre liga TCP_NODELAY; aqui vale a configuração
+    sock = writer.get_extra_info("socket")
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(TCP_NODELAY))
+    print(f"Conexao estabelecida com {addr}")
+    loop = asyncio.get_running_loop()
+    try:
+        for served in range(1, KEEP_ALIVE_MAX + 1):
+            # Prazo só para a espera da próxima requisição, não para o envio. Um
+            # timer que fecha a conexão custa menos que um wait_for (que cria
+            # uma tarefa por requisição)
+            idle = loop.call_later(KEEP_ALIVE_TIMEOUT, close_idle, writer, addr)
+            try:
+                request = await read_request(reader)
+            except ValueError as e:
+                await send_response(writer, "400 Bad Request", str(e))
+                break
+            finally:
+                idle.cancel()
+            if request is None:
+                break
+            start = time.monotonic()
+            keep_alive = await handle_request(
+                writer, addr, *request, keep_alive_ok=served < KEEP_ALIVE_MAX
+            )
+            stats.request(time.monotonic() - start)
+            if not keep_alive:
+                break
 
     except Exception as e:
         print(f"Erro com {addr}: {e}")
     finally:
-        conn.close()
+        active_connections -= 1
+        stats.connection_closed()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
         print(f"Conexao com {addr} encerrada.")
 
 
-def main():
-    host = "0.0.0.0"
-    port = 8080  # Porta escolhida (maior que 1024)
-    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_sock.bind((host, port))
-    server_sock.listen(5)
-    print(f"Servidor iniciado em {host}:{port}")
+def close_idle(writer, addr):
+    print(f"[{addr}] Conexao ociosa por {KEEP_ALIVE_TIMEOUT}s.")
+    writer.transport.abort()
 
+
+def stats_report():
+    cache = digests.stats()
+    cache["hit_rate"] = f"{cache['hit_rate']:.3f}"
+    report = stats.report() + "".join(
+        f"digest_{name} {value}\n" for name, value in cache.items()
+    )
+    report += "".join(
+        f"response_cache_{name} {value}\n" for name, value in responses.stats().items()
+    )
+    return report + f"disk_pending {disk_pending}\npid {os.getpid()}\n"
+
+
+async def dump_metrics(interval):
     while True:
+        await asyncio.sleep(interval)
+        print(stats.summary())
+
+
+def raise_fd_limit():
+    """Sobe o limite de descritores abertos ao máximo permitido (uma por conexão)."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
         try:
-            conn, addr = server_sock.accept()
-            # Cria uma thread para tratar cada conexão
-            threading.Thread(target=handle_client, args=(conn, addr)).start()
-        except Exception as e:
-            print("Erro ao aceitar conexao:", e)
-            break
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def listen_socket(host, port, reuse_port=False):
+    """
+    Socket de escuta com as opções configuradas. As conexões aceitas herdam os
+    buffers; o SO_RCVBUF precisa estar definido antes do handshake para valer
+    na escala da janela TCP. Com `reuse_port`, vários processos escutam na
+    mesma porta, cada um com seu socket e sua fila de accept.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if REUSE_ADDRESS:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if SEND_BUFFER_BYTES is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+    if RECV_BUFFER_BYTES is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_BYTES)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    sock.setblocking(False)
+    return sock
+
+
+async def serve(host=HOST, port=PORT, reuse_port=False):
+    raise_fd_limit()
+    loop = asyncio.get_running_loop()
+    # O pool de disco é o executor padrão: o fallback do sendfile também o usa
+    loop.set_default_executor(
+        ThreadPoolExecutor(DISK_WORKERS, thread_name_prefix="disco")
+    )
+    server = await asyncio.start_server(
+        handle_client, sock=listen_socket(host, port, reuse_port), limit=MAX_HEADER_SIZE
+    )
+    print(f"Servidor iniciado em {host}:{port} (processo {os.getpid()})")
+    tasks = [server.serve_forever()]
+    if METRICS_INTERVAL:
+        tasks.append(dump_metrics(METRICS_INTERVAL))
+    async with server:
+        await asyncio.gather(*tasks)
+
+
+def run(host=HOST, port=PORT, reuse_port=False):
+    try:
+        asyncio.run(serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    if PROCESSES > 1 and hasattr(socket, "SO_REUSEPORT"):
+        processes = [
+            multiprocessing.Process(target=run, args=(HOST, PORT, True))
+            for _ in range(PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    else:
+        run(HOST, PORT)
+    print("Servidor encerrado.")
 
 
 if __name__ == "__main__":